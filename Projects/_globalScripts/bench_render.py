@@ -0,0 +1,105 @@
+"""Benchmark the Markdown render stage of sync_from_asana.py on synthetic tasks.
+
+Usage:
+    python bench_render.py [--tasks 50000] [--projects 200] [--runs 3]
+
+No Asana access is needed: tasks are generated in memory and the per-project
+files plus the global summary are rendered into a temporary vault. Reports
+wall time (ms) for:
+  views    - building the TaskView model (role, sort key, anken, body per task)
+  projects - rendering every per-project asana-tasks.md
+  summary  - rendering asana-tasks-view.md
+  rerun    - a second full render against the files from the first (no-op writes)
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import sync_from_asana as sync
+
+USER_GID = "1000"
+
+
+def make_tasks(count, projects, seed=0):
+    """Generate `count` Asana-like task dicts spread over `projects` Asana projects."""
+    rng = random.Random(seed)
+    people = [{"gid": str(1000 + i), "name": f"User {i}"} for i in range(20)]
+    ankens = [f"Project{i}" for i in range(projects)] + [None] * projects
+    by_project = {str(5000 + i): [] for i in range(projects)}
+    gids = list(by_project)
+    for i in range(count):
+        notes_lines = rng.randint(0, 15)
+        anken = rng.choice(ankens)
+        task = {
+            "gid": str(10_000_000 + i),
+            "name": f"Task {i} " + "x" * rng.randint(5, 60),
+            "completed": rng.random() < 0.2,
+            "due_on": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.7 else None,
+            "assignee": rng.choice(people),
+            "followers": rng.sample(people, rng.randint(0, 4)),
+            "notes": "\n".join(f"note line {n}" for n in range(notes_lines)),
+            "custom_fields": [{"name": "案件", "text_value": anken}] if anken else [],
+            "num_subtasks": 0,
+        }
+        if rng.random() < 0.1:
+            task["subtasks_data"] = [
+                {"gid": f"{task['gid']}{n}", "name": f"Sub {n}", "completed": rng.random() < 0.5, "due_on": None}
+                for n in range(rng.randint(1, 5))
+            ]
+        by_project[rng.choice(gids)].append(task)
+    return by_project
+
+
+def render(vault, by_project):
+    """Run the render stage the same way sync_from_asana() does; return per-phase seconds."""
+    timings = {}
+    start = time.perf_counter()
+    model = sync.TaskViewModel(USER_GID)
+    project_data = [(f"Project{i}", [(f"Asana {gid}", gid, model.views(tasks))], [])
+                    for i, (gid, tasks) in enumerate(by_project.items())]
+    timings["views"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name, sections, personal in project_data:
+        sync.write_project_file(os.path.join(vault, name, "asana-tasks.md"), name, sections, personal)
+    timings["projects"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sync.write_global_summary(os.path.join(vault, "asana-tasks-view.md"), project_data, [])
+    timings["summary"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50_000, help="Number of synthetic tasks.")
+    parser.add_argument("--projects", type=int, default=200, help="Number of Asana projects to spread them over.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh-vault renders to average.")
+    args = parser.parse_args()
+
+    by_project = make_tasks(args.tasks, args.projects)
+    samples = {"views": [], "projects": [], "summary": [], "rerun": []}
+    for _ in range(args.runs):
+        # Writers print one line per file; silence them so the output stays readable
+        with tempfile.TemporaryDirectory() as vault, contextlib.redirect_stdout(io.StringIO()):
+            for phase, seconds in render(vault, by_project).items():
+                samples[phase].append(seconds)
+            start = time.perf_counter()
+            render(vault, by_project)
+            samples["rerun"].append(time.perf_counter() - start)
+
+    print(f"{args.tasks} tasks in {args.projects} projects, {args.runs} runs")
+    for phase, values in samples.items():
+        ms = [v * 1000 for v in values]
+        print(f"{phase:<9} mean={statistics.mean(ms):9.1f} ms  min={min(ms):9.1f} ms")
+    total = sum(statistics.mean(samples[p]) for p in ("views", "projects", "summary"))
+    print(f"{'total':<9} mean={total * 1000:9.1f} ms  ({args.tasks / total:,.0f} tasks/s)")
+
+
+if __name__ == "__main__":
+    main()
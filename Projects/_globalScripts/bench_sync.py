@@ -0,0 +1,199 @@
+"""Benchmark sync_from_asana.py end to end against fake_asana_server.py.
+
+Usage:
+    python bench_sync.py [--scenarios 10 100 1000] [--tasks 20] [--latency 50] [--throttle 0.0] [--rpm 1500]
+    python bench_sync.py --check [--throttle 0.2]
+
+For each scenario (number of 案件, one Asana project each, plus one personal
+project) a synthetic workspace is served locally and a throwaway
+Box/Vault/Projects tree is built in a temporary directory with a copy of
+sync_from_asana.py, so nothing in this checkout is read or written. The sync
+then runs twice in a fresh interpreter:
+  cold - empty discovery / project-name caches and an empty vault
+  warm - the same tree again (caches warm, every file unchanged)
+
+Reports wall time, API requests (as counted by the sync and by the server),
+429 retries and peak Python heap (tracemalloc; --no-memory skips it, since
+tracing slows the sync down). Requires the asana SDK (pip install asana).
+
+--check instead runs one small scenario with 429 injection (default: 20% of
+requests) and exits non-zero unless the sync completes and its metrics
+agree with the server: every request the server saw is counted by the sync,
+and 429s show up as retries. It then reassigns tasks and checks that an
+incremental sync renders the same files as a full one (ignoring "Last
+Sync:"). Throttling regressions in the fetch stage, in sync_metrics.json and
+in the incremental snapshot then show up without timing anything.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import fake_asana_server as fake
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SYNC_SCRIPT = os.path.join(SCRIPT_DIR, "sync_from_asana.py")
+
+# Runs inside the child interpreter: argv[1] is the copied _globalScripts directory
+RUNNER = r"""
+import contextlib, json, os, sys, time, tracemalloc
+sys.path.insert(0, sys.argv[1])
+trace = sys.argv[2] == "1"
+full = sys.argv[3] == "1"
+if trace:
+    tracemalloc.start()
+import sync_from_asana
+start = time.perf_counter()
+with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+    metrics = sync_from_asana.sync_from_asana(full=full)
+seconds = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1] if trace else None
+print(json.dumps({"seconds": seconds, "requests": metrics["requests_total"],
+                  "retries": metrics["retries"], "peak": peak}))
+"""
+
+
+def build_tree(root, workspace, base_url, rpm, incremental=False):
+    """Create Projects/_globalScripts, _config/paths.json, Box projects and an empty vault under root."""
+    scripts = os.path.join(root, "Projects", "_globalScripts")
+    os.makedirs(scripts)
+    os.makedirs(os.path.join(root, "Projects", "_config"))
+    os.makedirs(os.path.join(root, "Vault"))
+    shutil.copy(SYNC_SCRIPT, scripts)
+    with open(os.path.join(root, "Projects", "_config", "paths.json"), "w", encoding="utf-8") as f:
+        json.dump({"localProjectsRoot": os.path.join(root, "Projects"),
+                   "boxProjectsRoot": os.path.join(root, "Box", "Projects"),
+                   "obsidianVaultRoot": os.path.join(root, "Vault")}, f)
+    with open(os.path.join(scripts, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"asana_token": "fake", "user_gid": fake.USER_GID, "asana_base_url": base_url,
+                   "personal_project_gids": workspace["personal_gids"], "max_requests_per_minute": rpm,
+                   "incremental_sync": incremental}, f)
+    for gid in workspace["project_gids"]:
+        project_dir = os.path.join(root, "Box", "Projects", workspace["projects"][gid]["name"])
+        os.makedirs(project_dir)
+        with open(os.path.join(project_dir, "asana_config.json"), "w", encoding="utf-8") as f:
+            json.dump({"asana_project_gids": [gid]}, f)
+    return scripts
+
+
+def run_sync(scripts, trace, full=False):
+    result = subprocess.run([sys.executable, "-c", RUNNER, scripts, "1" if trace else "0", "1" if full else "0"],
+                            capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(f"sync failed (exit {result.returncode}):\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def read_vault(root):
+    """{relative path: content without "Last Sync:" lines} for every .md file in the vault."""
+    vault = os.path.join(root, "Vault")
+    files = {}
+    for dir_path, _, names in os.walk(vault):
+        for name in names:
+            if name.endswith(".md"):
+                path = os.path.join(dir_path, name)
+                with open(path, encoding="utf-8") as f:
+                    files[os.path.relpath(path, vault)] = "".join(
+                        line for line in f if not line.startswith("Last Sync:"))
+    return files
+
+
+def reassign_tasks(workspace):
+    """Hand the first open task the user is not on to the user, and one of the user's tasks to someone else.
+
+    The gained task loses its due date, so it ties on (role, due) with the user's other undated
+    tasks and only the Asana order decides where it is rendered.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    tasks = workspace["projects"][workspace["project_gids"][0]]["tasks"]
+    gained = next(t for t in tasks if not t["completed"] and t["assignee"]["gid"] != fake.USER_GID
+                  and all(f["gid"] != fake.USER_GID for f in t["followers"]))
+    lost = next(t for t in reversed(tasks) if t["assignee"]["gid"] == fake.USER_GID)
+    for task, gid in ((gained, fake.USER_GID), (lost, "10")):
+        task["assignee"] = {"gid": gid, "resource_type": "user", "name": f"User {gid}"}
+        task["followers"] = [f for f in task["followers"] if f["gid"] != fake.USER_GID]
+        task["modified_at"] = now
+    gained["due_on"] = None
+
+
+def check_throttled(projects, tasks, throttle, rpm):
+    """Run throttled syncs (full, incremental after reassignment, full again); returns a list of problems."""
+    workspace = fake.make_workspace(projects, tasks)
+    server = fake.start_server(workspace, throttle=throttle)
+    problems = []
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            scripts = build_tree(root, workspace, server.base_url, rpm, incremental=True)
+            try:
+                result = run_sync(scripts, False)
+                throttled = server.throttled
+                served = server.reset_counts()
+                reassign_tasks(workspace)
+                run_sync(scripts, False)
+                incremental = read_vault(root)
+                run_sync(scripts, False, full=True)
+                full = read_vault(root)
+            except RuntimeError as e:
+                return [str(e)]
+            differing = sorted(path for path in set(incremental) | set(full)
+                               if incremental.get(path) != full.get(path))
+            if differing:
+                problems.append(f"incremental sync differs from a full sync in {', '.join(differing)}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(f"{projects} projects, throttle={throttle:g}: {result['seconds']:.2f}s, {result['requests']} requests, "
+          f"{result['retries']} retries (server: {sum(served.values())} requests, {throttled} throttled, "
+          f"{served.get('POST /batch', 0)} batch)")
+    if result["requests"] != sum(served.values()):
+        problems.append(f"sync counted {result['requests']} requests, server saw {sum(served.values())}")
+    if throttled and not result["retries"]:
+        problems.append(f"server answered {throttled} requests with 429, sync counted no retries")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Numbers of projects to benchmark.")
+    parser.add_argument("--tasks", type=int, default=20, help="Tasks per Asana project.")
+    parser.add_argument("--latency", type=float, default=50.0, help="Fake server latency per request (ms).")
+    parser.add_argument("--throttle", type=float, help="Fraction of requests answered with 429 (default: 0, 0.2 with --check).")
+    parser.add_argument("--rpm", type=int, default=1500,
+                        help="max_requests_per_minute for the sync (Asana paid plans: 1500).")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc peak measurement.")
+    parser.add_argument("--check", action="store_true", help="Run one throttled 30-project sync and fail unless it completes with matching request counts.")
+    args = parser.parse_args()
+
+    if args.check:
+        problems = check_throttled(30, args.tasks, 0.2 if args.throttle is None else args.throttle, args.rpm)
+        for problem in problems:
+            print(f"FAIL: {problem}", file=sys.stderr)
+        sys.exit(1 if problems else 0)
+    args.throttle = args.throttle or 0.0
+
+    print(f"{args.tasks} tasks/project, latency={args.latency:g} ms, throttle={args.throttle:g}, rpm={args.rpm}")
+    print(f"{'projects':>8} {'run':<5} {'time':>9} {'requests':>9} {'server':>7} {'retries':>8} {'peak':>10}")
+    for projects in args.scenarios:
+        workspace = fake.make_workspace(projects, args.tasks)
+        server = fake.start_server(workspace, latency_ms=args.latency, throttle=args.throttle)
+        try:
+            with tempfile.TemporaryDirectory() as root:
+                scripts = build_tree(root, workspace, server.base_url, args.rpm)
+                for run in ("cold", "warm"):
+                    result = run_sync(scripts, not args.no_memory)
+                    served = sum(server.reset_counts().values())
+                    peak = f"{result['peak'] / 2**20:7.1f} MB" if result["peak"] is not None else "-"
+                    print(f"{projects:>8} {run:<5} {result['seconds']:8.2f}s {result['requests']:>9} "
+                          f"{served:>7} {result['retries']:>8} {peak:>10}", flush=True)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Local stand-in for the Asana REST API endpoints used by sync_from_asana.py.
+
+Usage:
+    python fake_asana_server.py [--port 0] [--projects 100] [--tasks 50] [--latency 50] [--throttle 0.02]
+
+Serves a synthetic workspace at http://127.0.0.1:PORT/api/1.0 so the sync can be
+benchmarked and regression-tested without touching the real API or its rate
+limits. Point the sync at it with "asana_base_url" in config.json.
+
+Endpoints:
+  GET  /tasks?project=GID         tasks of a project (limit/offset pagination,
+                                  completed_since, modified_since, opt_fields)
+  GET  /tasks/GID/subtasks        subtasks of a task (same pagination)
+  GET  /projects/GID              project name
+  POST /batch                     up to 10 GET actions on the endpoints above
+
+--latency adds a fixed delay (ms) to every request and --throttle answers that
+fraction of requests with 429 + Retry-After, like Asana's rate limiter.
+Personal projects (--personal) hold tasks whose 案件 field names a project
+("Project N"), as they would in a real workspace.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/api/1.0"
+USER_GID = "1"
+PROJECT_GID_BASE = 100_000
+PERSONAL_GID_BASE = 900_000
+MAX_BATCH_ACTIONS = 10
+
+
+def project_name(index):
+    """Name of the synthetic Asana project (and 案件) number `index`."""
+    return f"Project {index}"
+
+
+def make_workspace(projects=100, tasks_per_project=50, personal_projects=1, mine_ratio=0.5,
+                   subtask_ratio=0.1, seed=0):
+    """Generate a synthetic workspace.
+
+    Returns:
+        dict: {"projects": {gid: {"name", "tasks"}}, "subtasks": {task_gid: [subtasks]},
+               "project_gids": [...], "personal_gids": [...]}
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    people = [str(10 + i) for i in range(20)]
+    workspace = {"projects": {}, "subtasks": {}, "project_gids": [], "personal_gids": []}
+    next_task = 10_000_000
+
+    def make_task(anken):
+        nonlocal next_task
+        next_task += 1
+        gid = str(next_task)
+        completed = rng.random() < 0.2
+        modified = now - timedelta(hours=rng.randint(1, 24 * 60))
+        assignee = USER_GID if rng.random() < mine_ratio else rng.choice(people)
+        followers = rng.sample(people, rng.randint(0, 3))
+        if rng.random() < 0.2:
+            followers.append(USER_GID)
+        custom_fields = [{"gid": "77", "name": "Priority", "enum_value": {"gid": "78", "name": "High"},
+                          "text_value": None, "number_value": None}]
+        if anken:
+            custom_fields.append({"gid": "79", "name": "案件", "enum_value": None,
+                                  "text_value": anken, "number_value": None})
+        subtasks = []
+        if rng.random() < subtask_ratio:
+            subtasks = [{"gid": f"{gid}{n}", "name": f"Subtask {n}", "completed": rng.random() < 0.5,
+                         "due_on": None, "resource_type": "task"}
+                        for n in range(rng.randint(1, 5))]
+            workspace["subtasks"][gid] = subtasks
+        return {
+            "gid": gid,
+            "resource_type": "task",
+            "name": f"Task {gid} " + "x" * rng.randint(5, 60),
+            "completed": completed,
+            "completed_at": (modified.isoformat() if completed else None),
+            "due_on": (now + timedelta(days=rng.randint(-30, 60))).date().isoformat() if rng.random() < 0.7 else None,
+            "modified_at": modified.isoformat(),
+            "assignee": {"gid": assignee, "resource_type": "user", "name": f"User {assignee}"},
+            "followers": [{"gid": f, "resource_type": "user", "name": f"User {f}"} for f in followers],
+            "notes": "\n".join(f"note line {n}" for n in range(rng.randint(0, 15))),
+            "custom_fields": custom_fields,
+            "num_subtasks": len(subtasks),
+            "permalink_url": f"https://app.asana.com/0/0/{gid}",
+        }
+
+    for i in range(projects):
+        gid = str(PROJECT_GID_BASE + i)
+        workspace["projects"][gid] = {"name": project_name(i),
+                                      "tasks": [make_task(None) for _ in range(tasks_per_project)]}
+        workspace["project_gids"].append(gid)
+    for i in range(personal_projects):
+        gid = str(PERSONAL_GID_BASE + i)
+        tasks = [make_task(project_name(rng.randrange(projects)) if projects and rng.random() < 0.7 else None)
+                 for _ in range(tasks_per_project)]
+        workspace["projects"][gid] = {"name": f"Personal {i}", "tasks": tasks}
+        workspace["personal_gids"].append(gid)
+    return workspace
+
+
+def select_fields(item, opt_fields):
+    """Keep only the top-level fields named in opt_fields (plus gid), as the API does."""
+    if not opt_fields:
+        return item
+    wanted = {field.split(".", 1)[0] for field in opt_fields}
+    wanted.add("gid")
+    return {k: v for k, v in item.items() if k in wanted}
+
+
+class FakeAsanaServer(ThreadingHTTPServer):
+    """HTTP server holding the workspace, the fault settings and per-endpoint request counts."""
+
+    daemon_threads = True
+
+    def __init__(self, address, workspace, latency_ms=0.0, throttle=0.0, retry_after=1, seed=0):
+        super().__init__(address, FakeAsanaHandler)
+        self.workspace = workspace
+        self.latency = latency_ms / 1000.0
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.throttled = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}{API_PREFIX}"
+
+    def count(self, endpoint):
+        """Count a request; returns True if it should be answered with 429."""
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            throttled = self.rng.random() < self.throttle
+            self.throttled += throttled
+            return throttled
+
+    def reset_counts(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.throttled = 0
+        return counts
+
+    def page(self, items, query, opt_fields):
+        """Return one page in Asana's {"data", "next_page"} shape."""
+        limit = min(int(query.get("limit", 100)), 100)
+        offset = int(query.get("offset") or 0)
+        data = [select_fields(item, opt_fields) for item in items[offset:offset + limit]]
+        next_page = None
+        if offset + limit < len(items):
+            next_page = {"offset": str(offset + limit), "path": None, "uri": None}
+        return {"data": data, "next_page": next_page}
+
+    def dispatch(self, path, query):
+        """Handle one GET; returns (status, body)."""
+        opt_fields = query.get("opt_fields")
+        if isinstance(opt_fields, str):
+            opt_fields = opt_fields.split(",")
+        parts = path.strip("/").split("/")
+        if parts == ["tasks"]:
+            project = self.workspace["projects"].get(str(query.get("project")))
+            if project is None:
+                return 404, {"errors": [{"message": "project: Not a recognized ID"}]}
+            tasks = project["tasks"]
+            if query.get("completed_since"):
+                since = query["completed_since"]
+                tasks = [t for t in tasks if not t["completed"] or (t["completed_at"] or "") >= since]
+            if query.get("modified_since"):
+                tasks = [t for t in tasks if t["modified_at"] >= query["modified_since"]]
+            return 200, self.page(tasks, query, opt_fields)
+        if len(parts) == 3 and parts[0] == "tasks" and parts[2] == "subtasks":
+            return 200, self.page(self.workspace["subtasks"].get(parts[1], []), query, opt_fields)
+        if len(parts) == 2 and parts[0] == "projects":
+            project = self.workspace["projects"].get(parts[1])
+            if project is None:
+                return 404, {"errors": [{"message": "project: Not a recognized ID"}]}
+            return 200, {"data": select_fields({"gid": parts[1], "resource_type": "project",
+                                                "name": project["name"]}, opt_fields)}
+        return 404, {"errors": [{"message": f"No matching route for {path}"}]}
+
+
+class FakeAsanaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like app.asana.com
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def start(self, endpoint):
+        """Apply latency and 429 injection; returns False if the request was throttled."""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.count(endpoint):
+            self.send_json(429, {"errors": [{"message": "You have made too many requests recently."}]},
+                           {"Retry-After": str(self.server.retry_after)})
+            return False
+        return True
+
+    def route(self):
+        url = urlsplit(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return path, query
+
+    def do_GET(self):
+        path, query = self.route()
+        endpoint = "GET " + ("/tasks/{gid}/subtasks" if path.endswith("/subtasks")
+                             else "/projects/{gid}" if path.startswith("/projects/") else path)
+        if self.start(endpoint):
+            self.send_json(*self.server.dispatch(path, query))
+
+    def do_POST(self):
+        path, _ = self.route()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.start("POST " + path):
+            return
+        if path.rstrip("/") != "/batch":
+            self.send_json(404, {"errors": [{"message": f"No matching route for {path}"}]})
+            return
+        actions = (body.get("data") or {}).get("actions") or []
+        if len(actions) > MAX_BATCH_ACTIONS:
+            self.send_json(400, {"errors": [{"message": "actions: Too many actions"}]})
+            return
+        results = []
+        for action in actions:
+            options = dict(action.get("options") or {})
+            fields = options.pop("fields", None)
+            query = {**(action.get("data") or {}), **options}
+            if fields:
+                query["opt_fields"] = fields
+            url = urlsplit(action.get("relative_path", ""))
+            query.update({k: v[-1] for k, v in parse_qs(url.query).items()})
+            status, result = self.server.dispatch(url.path, query)
+            results.append({"status_code": status, "headers": {}, "body": result})
+        self.send_json(200, {"data": results})
+
+
+def start_server(workspace, port=0, latency_ms=0.0, throttle=0.0, retry_after=1, seed=0):
+    """Start a FakeAsanaServer on a background thread and return it (call .shutdown() to stop)."""
+    server = FakeAsanaServer(("127.0.0.1", port), workspace, latency_ms, throttle, retry_after, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (default: any free port).")
+    parser.add_argument("--projects", type=int, default=100, help="Number of Asana projects.")
+    parser.add_argument("--tasks", type=int, default=50, help="Tasks per project.")
+    parser.add_argument("--personal", type=int, default=1, help="Number of personal projects.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request (ms).")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workspace = make_workspace(args.projects, args.tasks, args.personal, seed=args.seed)
+    server = FakeAsanaServer(("127.0.0.1", args.port), workspace, args.latency, args.throttle,
+                             args.retry_after, args.seed)
+    print(f"Fake Asana API at {server.base_url} (user_gid {USER_GID}, "
+          f"{args.projects} projects x {args.tasks} tasks, personal: {', '.join(workspace['personal_gids'])})",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
-import asana
+import contextlib
+import hashlib
+import io
 import json
 import os
 import re
-from datetime import datetime
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 # --- 環境固有の設定 ---
@@ -10,8 +18,50 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECTS_ROOT = os.path.dirname(SCRIPT_DIR)  # Documents/Projects/
 CONFIG_PATH = os.path.join(SCRIPT_DIR, 'config.json')
 PATHS_JSON = os.path.join(PROJECTS_ROOT, '_config', 'paths.json')
+SNAPSHOT_DB = os.path.join(SCRIPT_DIR, 'asana_snapshot.db')
+DISCOVERY_CACHE = os.path.join(SCRIPT_DIR, '.discovery_cache.json')
+DISCOVERY_CACHE_VERSION = 1
+DEFAULT_DISCOVERY_WORKERS = 8
+PROJECT_CACHE = os.path.join(SCRIPT_DIR, '.project_cache.json')
+PROJECT_CACHE_VERSION = 1
+METRICS_PATH = os.path.join(SCRIPT_DIR, 'sync_metrics.json')
+METRICS_HISTORY_PATH = os.path.join(SCRIPT_DIR, 'sync_metrics_history.jsonl')
+PROFILE_PATH = os.path.join(SCRIPT_DIR, 'sync_profile.prof')
+DAEMON_STATE_PATH = os.path.join(SCRIPT_DIR, '.sync_daemon.json')
+TOKEN_SCRIPT = os.path.join(PROJECTS_ROOT, '_projectTemplate', 'scripts', 'get_tokens.py')
+MANIFEST_NAME = 'asana-tasks-manifest.json'  # asana-tasks-view.md と同じフォルダに出力する
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_ENCODING = 'o200k_base'
+DAEMON_CONNECT_TIMEOUT = 0.2
+DEFAULT_DAEMON_INTERVAL_MINUTES = 60
+# "schedule_minutes" 付きの sync を受けたら、その間隔 + この猶予まで自前の定期同期を見送る
+DAEMON_SCHEDULE_GRACE_SECONDS = 120
 # ----------------------
 
+# --- Asana API 呼び出し設定 (config.json で上書き可) ---
+DEFAULT_MAX_REQUESTS_PER_MINUTE = 150  # Asana 無料プランの上限
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_WRITE_WORKERS = 8  # 案件別ファイルを並行して書き出すスレッド数 (Box 上のファイル操作は遅い)
+MAX_ATTEMPTS = 3
+PAGE_SIZE = 100
+BATCH_SIZE = 10  # Asana Batch API の 1 リクエストあたりの最大アクション数
+# 取得する項目は出力・振り分けに使うものだけに絞る (config.json の "task_opt_fields" で上書き可)
+SUBTASK_OPT_FIELDS = 'name,completed,due_on'
+TASK_OPT_FIELDS = (
+    'name,completed,due_on,assignee.gid,notes,followers.gid,'
+    'custom_fields.name,custom_fields.text_value,custom_fields.enum_value.name,custom_fields.number_value,'
+    'num_subtasks,modified_at,completed_at'
+)
+# 役割の判定とインクリメンタル同期 (スナップショット) に必要な項目。"task_opt_fields" になければ補う
+REQUIRED_TASK_OPT_FIELDS = ('completed', 'completed_at', 'modified_at', 'assignee.gid', 'followers.gid')
+ANKEN_FIELD = '案件'
+NOTES_MAX_LINES = 10  # 出力するノートの最大行数 (完了タスクは 3 行)
+COMPLETED_WINDOW_DAYS = 7
+DEFAULT_FULL_RESYNC_HOURS = 24
+MODIFIED_SINCE_MARGIN_SECONDS = 60  # 時計のずれ・反映遅延を見込んで少し前から取り直す
+PROJECT_OPT_FIELDS = 'name'  # プロジェクトのメタデータとしてキャッシュする項目
+DEFAULT_PROJECT_NAME_TTL_HOURS = 24
+
 
 def load_config():
     """グローバル設定 (config.json) を読み込む"""
@@ -48,9 +98,78 @@ def load_paths():
     return paths
 
 
-def discover_projects(box_projects_root):
+def _scan_project_dir(scan_dir, cached):
+    """走査ディレクトリ直下の案件候補フォルダ名を返す
+
+    ディレクトリの mtime がキャッシュと同じなら一覧を読み直さない。
+
+    Returns:
+        dict or None: {'mtime_ns': ..., 'entries': [フォルダ名, ...]} (ディレクトリがなければ None)
+    """
+    try:
+        st = os.stat(scan_dir)
+    except OSError:
+        return None
+    if cached and cached.get('mtime_ns') == st.st_mtime_ns:
+        return cached
+    entries = [entry.name for entry in os.scandir(scan_dir)
+               if entry.is_dir() and not (entry.name.startswith('_') and entry.name != '_INHOUSE')]
+    return {'mtime_ns': st.st_mtime_ns, 'entries': entries}
+
+
+def _read_asana_config(config_file, cached):
+    """asana_config.json を読み込む。(mtime, size) がキャッシュと同じなら読み直さない
+
+    Returns:
+        tuple: (asana_config, キャッシュエントリ or None, 警告メッセージ or None)
+    """
+    try:
+        st = os.stat(config_file)
+    except OSError:
+        return {}, {'missing': True}, None
+    if cached and cached.get('mtime_ns') == st.st_mtime_ns and cached.get('size') == st.st_size:
+        return cached['content'], cached, None
+    try:
+        with open(config_file, 'r', encoding='utf-8-sig') as f:
+            asana_config = json.load(f)
+    except Exception as e:
+        # 読み込みエラーはキャッシュせず、次回も読み直して警告する
+        return {}, None, f"  WARNING: Failed to read {config_file}: {e}"
+    return asana_config, {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'content': asana_config}, None
+
+
+def load_discovery_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {'dirs': {}, 'configs': {}}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') == DISCOVERY_CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {'dirs': {}, 'configs': {}}
+
+
+def save_discovery_cache(cache_path, cache):
+    cache['version'] = DISCOVERY_CACHE_VERSION
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"  WARNING: Failed to save discovery cache: {e}")
+
+
+def discover_projects(box_projects_root, cache_path=DISCOVERY_CACHE, workers=DEFAULT_DISCOVERY_WORKERS):
     """boxProjectsRoot 配下を走査し、asana_config.json を持つ案件を検出する
 
+    Box Drive 上では stat/open の 1 回ごとに遅延やダウンロードが発生するため、走査ディレクトリの
+    一覧と asana_config.json の内容を cache_path にキャッシュする。mtime が変わったディレクトリ、
+    (mtime, size) が変わった設定ファイルだけをスレッドプールで並行して読み直す。
+    cache_path に None を渡すとキャッシュを使わない。
+
     Returns:
         list of dict: [{
             'name': 案件名,
@@ -68,34 +187,69 @@ def discover_projects(box_projects_root):
         (os.path.join(box_projects_root, '_domains', '_mini'), 'Projects/_domains/_mini'),
     ]
 
-    for scan_dir, prefix in scan_dirs:
-        if not os.path.isdir(scan_dir):
-            continue
-        for entry in os.scandir(scan_dir):
-            if not entry.is_dir() or (entry.name.startswith('_') and entry.name != '_INHOUSE'):
+    cache = load_discovery_cache(cache_path)
+    new_cache = {'dirs': {}, 'configs': {}}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        listings = list(pool.map(lambda d: _scan_project_dir(d[0], cache['dirs'].get(d[0])), scan_dirs))
+        candidates = []  # [(prefix, フォルダ名, フォルダパス, 設定ファイルパス)]
+        for (scan_dir, prefix), listing in zip(scan_dirs, listings):
+            if listing is None:
                 continue
-            config_file = os.path.join(entry.path, 'asana_config.json')
-            asana_config = {}
-            if os.path.exists(config_file):
-                try:
-                    with open(config_file, 'r', encoding='utf-8-sig') as f:
-                        asana_config = json.load(f)
-                except Exception as e:
-                    print(f"  WARNING: Failed to read {config_file}: {e}")
-                    
-            projects.append({
-                'name': entry.name,
-                'box_path': entry.path,
-                'relative_path': f"{prefix}/{entry.name}",
-                'asana_config': asana_config,
-                'anken_aliases': asana_config.get('anken_aliases', []),
-            })
-            aliases_info = f", aliases: {asana_config['anken_aliases']}" if asana_config.get('anken_aliases') else ""
-            print(f"  Found: {prefix}/{entry.name} ({len(asana_config.get('asana_project_gids', []))} Asana projects{aliases_info})")
+            new_cache['dirs'][scan_dir] = listing
+            for name in listing['entries']:
+                path = os.path.join(scan_dir, name)
+                candidates.append((prefix, name, path, os.path.join(path, 'asana_config.json')))
+        configs = list(pool.map(lambda c: _read_asana_config(c[3], cache['configs'].get(c[3])), candidates))
+
+    for (prefix, name, path, config_file), (asana_config, entry, warning) in zip(candidates, configs):
+        if warning:
+            print(warning)
+        if entry is not None:
+            new_cache['configs'][config_file] = entry
+        projects.append({
+            'name': name,
+            'box_path': path,
+            'relative_path': f"{prefix}/{name}",
+            'asana_config': asana_config,
+            'anken_aliases': asana_config.get('anken_aliases', []),
+        })
+        aliases_info = f", aliases: {asana_config['anken_aliases']}" if asana_config.get('anken_aliases') else ""
+        print(f"  Found: {prefix}/{name} ({len(asana_config.get('asana_project_gids', []))} Asana projects{aliases_info})")
 
+    if cache_path and (new_cache['dirs'] != cache['dirs'] or new_cache['configs'] != cache['configs']):
+        save_discovery_cache(cache_path, new_cache)
     return projects
 
 
+def normalize_anken(name):
+    """案件名の照合用キー (大文字小文字・空白の違いを無視する)"""
+    return ' '.join(str(name).split()).casefold()
+
+
+def build_anken_index(projects):
+    """案件名・ベース名 ([Domain]/[Mini] を除いた名前)・anken_aliases から案件への索引を作る
+
+    同じキーが複数の案件に該当する場合は先に検出された案件を優先し、警告を出す。
+
+    Returns:
+        dict: {正規化したキー: projects 内のインデックス}
+    """
+    index = {}
+    for i, proj in enumerate(projects):
+        base_name = re.sub(r'\s*(?:\[Domain\]|\[Mini\])+$', '', proj['name'], flags=re.IGNORECASE)
+        seen = set()
+        for key in [proj['name'], base_name, *proj.get('anken_aliases', [])]:
+            norm = normalize_anken(key)
+            if not norm or norm in seen:
+                continue
+            seen.add(norm)
+            owner = index.setdefault(norm, i)
+            if owner != i:
+                print(f"  WARNING: Anken key '{key}' of {proj['relative_path']} is already used by "
+                      f"{projects[owner]['relative_path']}; tasks stay routed to {projects[owner]['relative_path']}")
+    return index
+
+
 def get_custom_field_value(task, field_name):
     """カスタムフィールドの値を取得する"""
     custom_fields = task.get('custom_fields', [])
@@ -113,8 +267,13 @@ def get_custom_field_value(task, field_name):
     return None
 
 
+# メモ欄の行分類: メモ開始マーカー (行内のどこでも) / タスク行 / 見出し。マーカーを優先する
+_MEMO_LINE = re.compile(r'(?:.*?<!-- Memo area for (\w+) -->)|\s*- \[[ x]\]|#')
+MEMO_MERGE_RULES = ('per-file', 'project', 'view', 'newest')
+
+
 def load_existing_memos(file_path):
-    """既存のMarkdownファイルからメモ部分を抽出する"""
+    """既存のMarkdownファイルからメモ部分を抽出する (1 パス)"""
     if not os.path.exists(file_path):
         return {}
 
@@ -124,14 +283,17 @@ def load_existing_memos(file_path):
 
     with open(file_path, 'r', encoding='utf-8') as f:
         for line in f:
-            match = re.search(r'<!-- Memo area for (\w+) -->', line)
-            if match:
+            # メモ欄の外ではマーカーを含む行以外は読み飛ばす
+            if current_gid is None and 'Memo area for' not in line:
+                continue
+            match = _MEMO_LINE.match(line)
+            if match and match.group(1):
                 if current_gid:
                     memos[current_gid] = "".join(current_memo)
                 current_gid = match.group(1)
                 current_memo = []
             elif current_gid:
-                if re.match(r'^\s*- \[[ x]\]', line) or re.match(r'^#', line):
+                if match:
                     memos[current_gid] = "".join(current_memo)
                     current_gid = None
                     current_memo = []
@@ -144,6 +306,97 @@ def load_existing_memos(file_path):
     return memos
 
 
+class MemoStore:
+    """同期 1 回分のメモ欄の保持
+
+    各出力ファイルは 1 回だけ読み込む。merge (config.json の "memo_merge") で、同じタスクの
+    メモが複数のファイル (案件別ファイルと asana-tasks-view.md など) にある場合の扱いを決める。
+
+        per-file: ファイルごとに自分のメモを保持する (従来どおり)
+        project:  案件別/個人ファイルのメモを優先し、全ファイルで同じメモを使う
+        view:     asana-tasks-view.md のメモを優先し、全ファイルで同じメモを使う
+        newest:   最後に更新されたファイルのメモを全ファイルで使う
+    """
+
+    def __init__(self, merge='per-file', file_cache=None):
+        if merge not in MEMO_MERGE_RULES:
+            print(f"  WARNING: Unknown memo_merge '{merge}', using 'per-file'")
+            merge = 'per-file'
+        self.merge = merge
+        # 同期をまたいで使い回す読み込み結果 {path: (mtime_ns, size, memos)} (--daemon 用)
+        self.file_cache = file_cache
+        self._files = {}
+        self._merged = None
+
+    def load(self, path):
+        """1 ファイル分のメモ {gid: memo} (読み込みは 1 回だけ)
+
+        読めなかったファイルはそのエラーを覚えておき、呼ばれるたびに送出する
+        (メモを失わないよう、そのファイルは書き出さない)。
+        """
+        memos = self._files.get(path)
+        if memos is None:
+            memos = self._files[path] = self._try_read(path)
+        if isinstance(memos, Exception):
+            raise memos
+        return memos
+
+    def _try_read(self, path):
+        try:
+            return self._read(path)
+        except (OSError, UnicodeDecodeError) as e:
+            return e
+
+    def _read(self, path):
+        if self.file_cache is None:
+            return load_existing_memos(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.file_cache.pop(path, None)
+            return {}
+        cached = self.file_cache.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        memos = load_existing_memos(path)
+        self.file_cache[path] = (st.st_mtime_ns, st.st_size, memos)
+        return memos
+
+    def preload(self, paths, summary_path, workers=1):
+        """全出力ファイルのメモを読み込み、merge ルールに従って統合する (workers 本のスレッドで読む)"""
+        if self.merge == 'per-file':
+            return
+        paths = list(dict.fromkeys(paths))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for path, memos in zip(paths + [summary_path], pool.map(self._try_read, paths + [summary_path])):
+                    self._files.setdefault(path, memos)
+        if self.merge == 'project':
+            order = [p for p in paths if p != summary_path] + [summary_path]
+        elif self.merge == 'view':
+            order = [summary_path] + [p for p in paths if p != summary_path]
+        else:
+            mtimes = {p: os.path.getmtime(p) if os.path.exists(p) else 0 for p in paths + [summary_path]}
+            order = sorted(mtimes, key=mtimes.get, reverse=True)
+        merged = {}
+        for path in order:
+            try:
+                memos = self.load(path)
+            except (OSError, UnicodeDecodeError):
+                continue  # memos_for(path) で改めて送出する
+            for gid, memo in memos.items():
+                if memo.strip() and gid not in merged:
+                    merged[gid] = memo
+        self._merged = merged
+
+    def memos_for(self, path):
+        """出力ファイル path に書き戻すメモ {gid: memo}"""
+        memos = self.load(path)
+        if self._merged is not None:
+            return self._merged
+        return memos
+
+
 def classify_task_role(task, user_gid):
     """タスクの自分の役割を判定する
 
@@ -162,255 +415,1251 @@ def classify_task_role(task, user_gid):
     return '他'
 
 
-def task_sort_key(task, user_gid):
-    """タスクのソートキー: ロール順 (担当→コラボ→他) → 期限昇順 (期限なしは末尾)"""
-    role_order = {'担当': 0, 'コラボ': 1, '他': 2}
-    role = classify_task_role(task, user_gid)
-    due = task.get('due_on') or '9999-99-99'
-    return (role_order.get(role, 9), due)
+ROLE_ORDER = {'担当': 0, 'コラボ': 1, '他': 2}
+
+
+def render_task_body(task, role, anken, max_notes=None, subtasks=True):
+    """タスク 1 件の Markdown (タスク行・ノート・サブタスク。メモ欄を除く) を生成する
+
+    max_notes / subtasks はトークン予算に収めるための縮小用 (TokenBudget)。
+    """
+    gid = task['gid']
+    checkbox = 'x' if task.get('completed') else ' '
+    due = f" (Due: {task.get('due_on')})" if task.get('due_on') else ""
+    role_tag = f"[{role}] " if role else ""
+    anken_tag = f"[{anken}] " if anken else ""
+
+    out = [f"- [{checkbox}] {role_tag}{anken_tag}{task['name']}{due} [[Asana](https://app.asana.com/0/0/{gid})]\n"]
+
+    notes = (task.get('notes') or '').strip()
+    if notes:
+        lines = notes.splitlines()
+        max_lines = 3 if task.get('completed') else NOTES_MAX_LINES
+        if max_notes is not None:
+            max_lines = min(max_lines, max_notes)
+        if len(lines) > max_lines:
+            lines = lines[:max_lines] + ["..."]
+        if max_lines:
+            out.extend(f"    > {l}\n" if l else "    >\n" for l in lines)
+
+    for sub in (task.get('subtasks_data') or []) if subtasks else []:
+        sub_check = 'x' if sub.get('completed') else ' '
+        sub_due = f" (Due: {sub.get('due_on')})" if sub.get('due_on') else ""
+        out.append(f"    - [{sub_check}] {sub['name']}{sub_due} [[Asana](https://app.asana.com/0/0/{sub['gid']})]\n")
+
+    return "".join(out)
+
 
+class TaskView:
+    """レンダリング用に事前計算したタスク 1 件分の情報
 
-def deduplicate_tasks(tasks):
+    役割・ソートキー・案件名・Markdown 本文をタスクごとに 1 回だけ計算し、
+    同じタスクを出力する全ファイルで使い回す。
+    """
+
+    __slots__ = ('task', 'gid', 'completed', 'due', 'role', 'sort_key', 'anken', 'body')
+
+    def __init__(self, task, user_gid):
+        self.task = task
+        self.gid = task['gid']
+        self.completed = bool(task.get('completed'))
+        self.due = task.get('due_on') or ''
+        self.role = classify_task_role(task, user_gid)
+        # ロール順 (担当→コラボ→他) → 期限昇順 (期限なしは末尾)
+        self.sort_key = (ROLE_ORDER.get(self.role, 9), self.due or '9999-99-99')
+        self.anken = get_custom_field_value(task, ANKEN_FIELD)
+        self.body = render_task_body(task, self.role, self.anken)
+
+
+class TaskViewModel:
+    """タスク dict から TaskView への対応表
+
+    同じタスク dict が複数の案件・サマリーに現れても TaskView は 1 つだけ作る。
+    """
+
+    def __init__(self, user_gid):
+        self.user_gid = user_gid
+        self._views = {}
+
+    def views(self, tasks):
+        result = []
+        for task in tasks:
+            view = self._views.get(id(task))
+            if view is None:
+                view = self._views[id(task)] = TaskView(task, self.user_gid)
+            result.append(view)
+        return result
+
+
+def sort_key(view):
+    return view.sort_key
+
+
+def deduplicate_tasks(views):
     """GID が重複するタスクを除去する (due_on が最新のものを残す)
 
     同じタスクが複数の Asana プロジェクトに存在する場合、
     due_on が最も新しいエントリを採用する。
     """
     seen = {}
-    for task in tasks:
-        gid = task['gid']
-        if gid in seen:
-            existing_due = seen[gid].get('due_on') or ''
-            new_due = task.get('due_on') or ''
-            if new_due > existing_due:
-                seen[gid] = task
-        else:
-            seen[gid] = task
+    for view in views:
+        existing = seen.get(view.gid)
+        if existing is None or view.due > existing.due:
+            seen[view.gid] = view
     return list(seen.values())
 
 
-def fetch_tasks_for_project(tasks_api, project_gid):
-    """Asana プロジェクトから全タスクを取得する"""
-    import time
-    for attempt in range(3):
+def split_tasks(views):
+    """重複を除去し、(進行中 [ソート済み], 完了) に分ける"""
+    views = deduplicate_tasks(views)
+    in_progress = sorted((v for v in views if not v.completed), key=sort_key)
+    completed = [v for v in views if v.completed]
+    return in_progress, completed
+
+
+class SyncMetrics:
+    """同期 1 回分の計測値
+
+    フェーズ・Asana プロジェクトごとの所要時間、エンドポイントごとのリクエスト数、
+    429 による再試行と停止時間 (backoff)、レートリミッタのトークン補充待ち (全スレッドの合計。
+    429 の停止中の待ちは含めない)、書き込み/スキップしたファイルのバイト数、タスク数を集計し、
+    sync_metrics.json (と履歴の sync_metrics_history.jsonl) に書き出す。
+    複数スレッドから更新されるため、更新はロックを取って行う。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.last_lap = self.start
+        self.phases = {}
+        self.projects = {}
+        self.requests = {}
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.rate_limit_wait_seconds = 0.0
+        self.files = {'written': 0, 'unchanged': 0, 'bytes_written': 0, 'bytes_unchanged': 0}
+        self.tasks = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """with ブロックの所要時間をフェーズ name として記録する"""
+        start = time.perf_counter()
         try:
-            # 直近7日間に完了したタスクも含めて取得する
-            from datetime import datetime, timedelta
-            from datetime import timezone
-            completed_since_date = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-            
-            tasks = list(tasks_api.get_tasks({
-                'project': project_gid,
-                'opt_fields': (
-                    'name,completed,due_on,assignee,assignee.name,assignee.gid,'
-                    'notes,gid,projects,projects.name,'
-                    'followers,followers.gid,followers.name,'
-                    'custom_fields,custom_fields.name,'
-                    'custom_fields.text_value,custom_fields.enum_value,custom_fields.number_value,'
-                    'num_subtasks'
-                ),
-                'completed_since': completed_since_date
-            }))
-            return tasks
-        except Exception as e:
-            if hasattr(e, 'status') and e.status == 429:
-                time.sleep(2 * (attempt + 1))
-            else:
-                print(f"  WARNING: Failed to fetch tasks for project {project_gid}: {e}")
-                return []
-    return []
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = round(self.phases.get(name, 0.0) + time.perf_counter() - start, 3)
+
+    def lap(self, name):
+        """前回の lap (または reset) からの経過時間をフェーズ name に加算する"""
+        now = time.perf_counter()
+        with self.lock:
+            self.phases[name] = round(self.phases.get(name, 0.0) + now - self.last_lap, 3)
+            self.last_lap = now
+
+    def request(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def retry(self, backoff):
+        with self.lock:
+            self.retries += 1
+            self.backoff_seconds += backoff
+
+    def rate_limit_wait(self, seconds):
+        with self.lock:
+            self.rate_limit_wait_seconds += seconds
+
+    def project(self, project_gid, **values):
+        with self.lock:
+            self.projects.setdefault(project_gid, {}).update(values)
+
+    def file(self, written, size):
+        key = 'written' if written else 'unchanged'
+        with self.lock:
+            self.files[key] += 1
+            self.files[f'bytes_{key}'] += size
+
+    def count(self, name, value):
+        with self.lock:
+            self.tasks[name] = value
+
+    def to_dict(self, status):
+        with self.lock:
+            return {
+                'started_at': self.started_at,
+                'status': status,
+                'total_seconds': round(time.perf_counter() - self.start, 3),
+                'phases': dict(self.phases),
+                'projects': {gid: dict(values) for gid, values in self.projects.items()},
+                'requests': dict(sorted(self.requests.items())),
+                'requests_total': sum(self.requests.values()),
+                'retries': self.retries,
+                'backoff_seconds': round(self.backoff_seconds, 3),
+                'rate_limit_wait_seconds': round(self.rate_limit_wait_seconds, 3),
+                'files': dict(self.files),
+                'tasks': dict(self.tasks),
+            }
+
+    def save(self, status, path=METRICS_PATH, history_path=METRICS_HISTORY_PATH, history_limit=0):
+        """計測値を path に書き出し、history_limit > 0 なら履歴 (JSON Lines) に追記する"""
+        data = self.to_dict(status)
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            if history_limit > 0:
+                lines = []
+                if os.path.exists(history_path):
+                    with open(history_path, 'r', encoding='utf-8') as f:
+                        lines = [line for line in f if line.strip()]
+                lines = lines[-(history_limit - 1):] if history_limit > 1 else []
+                lines.append(json.dumps(data, ensure_ascii=False) + "\n")
+                tmp_path = f"{history_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                os.replace(tmp_path, history_path)
+        except OSError as e:
+            print(f"  WARNING: Failed to save sync metrics: {e}")
+        return data
+
+
+METRICS = SyncMetrics()
+
+
+class RateLimiter:
+    """全スレッドで共有するトークンバケット型のレートリミッタ
+
+    requests_per_minute の速度でトークンを補充し、1 リクエストごとに 1 つ消費する。
+    429 を受けたら Retry-After の秒数だけ全スレッドのリクエストを止める。
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_MAX_REQUESTS_PER_MINUTE):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, requests_per_minute / 10.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを 1 つ取得する (なければ補充まで待つ)"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                paused = now < self.paused_until
+                if paused:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            if not paused:
+                # 429 による停止は call_asana が backoff として記録済み (スレッドごとに足すと重複する)
+                METRICS.rate_limit_wait(wait)
+            time.sleep(wait)
+
+    def backoff(self, seconds):
+        """429 応答時: 全スレッドを seconds 秒停止し、バケットを空にする"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+
+def retry_after_seconds(e, attempt):
+    """429 例外の Retry-After ヘッダ (秒) を返す。なければ従来どおり 2, 4, 6 秒"""
+    headers = getattr(e, 'headers', None)
+    if headers:
+        try:
+            return max(0.0, float(headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            pass
+    return 2 * (attempt + 1)
+
 
+def call_asana(limiter, func, *args, endpoint=None):
+    """レートリミッタを通して Asana API を呼び出す。429 は Retry-After に従い再試行する
 
-def fetch_project_name(projects_api, project_gid):
-    """Asana プロジェクト名を取得する"""
-    import time
-    for attempt in range(3):
+    endpoint は計測用の名前 (省略時は func の名前)。
+    """
+    endpoint = endpoint or getattr(func, '__name__', 'unknown')
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        METRICS.request(endpoint)
         try:
-            project = projects_api.get_project(project_gid, {'opt_fields': 'name'})
-            return project.get('name', project_gid)
+            return func(*args)
         except Exception as e:
-            if hasattr(e, 'status') and e.status == 429:
-                time.sleep(2 * (attempt + 1))
+            if getattr(e, 'status', None) == 429 and attempt < MAX_ATTEMPTS - 1:
+                backoff = retry_after_seconds(e, attempt)
+                METRICS.retry(backoff)
+                limiter.backoff(backoff)
+                continue
+            raise
+
+
+def iterate_pages(limiter, items, page_size=PAGE_SIZE, endpoint='unknown'):
+    """遅延ページングのイテレータを、次ページ取得の前にトークンを取得しながら回す
+
+    1 ページ目のリクエストは呼び出し元の call_asana が計上済み。2 ページ目以降は取得前に
+    トークンを取り、実際に項目が届いたときだけリクエストとして記録する
+    (ちょうど page_size 件で終わる場合、次ページのリクエストは発生しない)。
+    """
+    count = 0
+    for item in items:
+        if count and count % page_size == 0:
+            METRICS.request(endpoint)
+        yield item
+        count += 1
+        if count % page_size == 0:
+            limiter.acquire()
+
+
+def task_opt_fields(config):
+    """config.json の "task_opt_fields" (省略時は TASK_OPT_FIELDS) に必須項目を補って返す
+
+    REQUIRED_TASK_OPT_FIELDS が欠けていると、担当/コラボのタスクが落ちたり
+    インクリメンタル同期が更新を検出できなくなったりするため、警告して追加する。
+    """
+    fields = config.get('task_opt_fields', TASK_OPT_FIELDS)
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    names = [f.strip() for f in fields if f.strip()]
+    # "assignee" のように親の項目ごと取得する指定でも満たす
+    missing = [f for f in REQUIRED_TASK_OPT_FIELDS if f not in names and f.split('.')[0] not in names]
+    if missing:
+        print(f"  WARNING: task_opt_fields is missing {', '.join(missing)} "
+              f"(needed for task roles and incremental sync); adding them")
+    return ','.join(names + missing)
+
+
+def completed_cutoff():
+    """完了タスクを表示する期間の開始時刻 (UTC ISO 8601)"""
+    return (datetime.now(timezone.utc) - timedelta(days=COMPLETED_WINDOW_DAYS)).isoformat()
+
+
+def compact_task(task):
+    """出力・振り分けに必要な項目だけを残したタスクを返す
+
+    ノートは出力する行数 (NOTES_MAX_LINES) で切り詰め、フォロワーは GID だけ、
+    カスタムフィールドは案件フィールドだけを残す。
+    """
+    compact = {k: task[k] for k in ('gid', 'name', 'completed', 'due_on', 'num_subtasks',
+                                    'modified_at', 'completed_at') if k in task}
+    assignee = task.get('assignee')
+    compact['assignee'] = {'gid': assignee.get('gid')} if assignee else None
+    compact['followers'] = [{'gid': f.get('gid')} for f in task.get('followers') or []]
+
+    notes = (task.get('notes') or '').strip()
+    lines = notes.splitlines()
+    if len(lines) > NOTES_MAX_LINES:
+        # 出力時も同じ "..." 付きの表示になる形で切り詰める
+        notes = "\n".join(lines[:NOTES_MAX_LINES] + ["..."])
+    compact['notes'] = notes
+
+    compact['custom_fields'] = [
+        {
+            'name': field.get('name'),
+            'text_value': field.get('text_value'),
+            'enum_value': {'name': field['enum_value'].get('name')} if field.get('enum_value') else None,
+            'number_value': field.get('number_value'),
+        }
+        for field in task.get('custom_fields') or [] if field.get('name') == ANKEN_FIELD
+    ]
+    return compact
+
+
+def fetch_task_list(tasks_api, project_gid, limiter, user_gid, modified_since=None, opt_fields=TASK_OPT_FIELDS):
+    """Asana プロジェクトの担当/コラボのタスクを取得する (失敗時は例外を送出)
+
+    ページを受け取りながら役割で絞り込み、担当/コラボのタスクは compact_task() した形で、
+    それ以外は GID だけを保持する。modified_since を指定すると、その時刻以降に更新された
+    タスクだけを取得する。user_gid に GID のリストを渡すと (チームモード)、いずれかの
+    ユーザーの担当/コラボのタスクを残す。
+
+    Returns:
+        tuple: (mine, other_gids)
+    """
+    # 直近7日間に完了したタスクも含めて取得する
+    opts = {
+        'project': project_gid,
+        'opt_fields': opt_fields,
+        'completed_since': completed_cutoff(),
+        'limit': PAGE_SIZE,
+    }
+    if modified_since:
+        opts['modified_since'] = modified_since
+
+    user_gids = (user_gid,) if isinstance(user_gid, str) else tuple(user_gid)
+
+    def collect():
+        mine, other_gids = [], []
+        for task in iterate_pages(limiter, tasks_api.get_tasks(opts), endpoint='get_tasks'):
+            if any(classify_task_role(task, gid) in ('担当', 'コラボ') for gid in user_gids):
+                mine.append(compact_task(task))
             else:
-                print(f"  WARNING: Failed to fetch project name for {project_gid}: {e}")
-                return project_gid
-    return project_gid
+                other_gids.append(task['gid'])
+        return mine, other_gids
 
+    return call_asana(limiter, collect, endpoint='get_tasks')
 
-def fetch_subtasks(tasks_api, task_gid):
-    """タスクのサブタスクを取得する"""
-    import time
-    for attempt in range(3):
+
+def fetch_tasks_for_project(tasks_api, project_gid, limiter, user_gid):
+    """Asana プロジェクトから担当/コラボのタスクを取得する"""
+    try:
+        return fetch_task_list(tasks_api, project_gid, limiter, user_gid)[0]
+    except Exception as e:
+        print(f"  WARNING: Failed to fetch tasks for project {project_gid}: {e}")
+        return []
+
+
+class ProjectMetadataCache:
+    """Asana プロジェクトのメタデータ (PROJECT_OPT_FIELDS) の永続キャッシュ
+
+    TTL 内のエントリはリクエストせずに使う。TTL を過ぎたエントリもその回はキャッシュの値を使い、
+    バックグラウンドで取り直して次回以降に反映する。取り直しに失敗 (429・ネットワーク障害など)
+    した場合はキャッシュの値をそのまま使い続ける。
+    """
+
+    def __init__(self, path=PROJECT_CACHE, ttl_hours=DEFAULT_PROJECT_NAME_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._refreshing = {}
+        self._dirty = False
+        self._entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == PROJECT_CACHE_VERSION:
+                    self._entries = data.get('projects', {})
+            except (OSError, ValueError):
+                pass
+
+    def get(self, project_gid):
+        """キャッシュ済みのメタデータを返す
+
+        Returns:
+            tuple: (fields or None, TTL 内かどうか)
+        """
+        with self._lock:
+            entry = self._entries.get(project_gid)
+        if entry is None or not all(k in entry['fields'] for k in PROJECT_OPT_FIELDS.split(',')):
+            return None, False
+        return entry['fields'], time.time() - entry['fetched_at'] < self.ttl
+
+    def put(self, project_gid, project):
+        fields = {k: project.get(k) for k in PROJECT_OPT_FIELDS.split(',')}
+        with self._lock:
+            self._entries[project_gid] = {'fields': fields, 'fetched_at': time.time()}
+            self._dirty = True
+
+    def refresh(self, project_gid, fetch):
+        """fetch() でメタデータをバックグラウンドで取り直す (失敗時はキャッシュを残す)"""
+        with self._lock:
+            if project_gid in self._refreshing:
+                return
+
+            def run():
+                try:
+                    self.put(project_gid, fetch())
+                except Exception as e:
+                    print(f"  WARNING: Failed to refresh project {project_gid} (keeping cached name): {e}")
+                finally:
+                    with self._lock:
+                        self._refreshing.pop(project_gid, None)
+
+            self._refreshing[project_gid] = self._pool.submit(run)
+
+    def flush(self):
+        """実行中の取り直しを待ち、変更があれば保存する"""
+        with self._lock:
+            pending = list(self._refreshing.values())
+        for future in pending:
+            future.result()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'version': PROJECT_CACHE_VERSION, 'projects': dict(self._entries)}
+            self._dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
         try:
-            subs = list(tasks_api.get_subtasks_for_task(task_gid, {
-                'opt_fields': 'name,completed,due_on,assignee,assignee.name,assignee.gid'
-            }))
-            return subs
-        except Exception as e:
-            if hasattr(e, 'status') and e.status == 429:
-                time.sleep(2 * (attempt + 1))
-            else:
-                print(f"  WARNING: Failed to fetch subtasks for task {task_gid}: {e}")
-                return []
-    return []
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  WARNING: Failed to save project cache: {e}")
 
+    def close(self):
+        """バックグラウンドの取り直しを待って保存し、ワーカーを止める"""
+        self.flush()
+        self._pool.shutdown(wait=True)
 
-def write_task_line(f, task, role, existing_memos):
-    """タスクの1行を出力する"""
-    gid = task['gid']
-    checkbox = 'x' if task.get('completed') else ' '
-    due = f" (Due: {task.get('due_on')})" if task.get('due_on') else ""
-    role_tag = f"[{role}] " if role else ""
-    anken = get_custom_field_value(task, '案件')
-    anken_tag = f"[{anken}] " if anken else ""
 
-    f.write(f"- [{checkbox}] {role_tag}{anken_tag}{task['name']}{due} [[Asana](https://app.asana.com/0/0/{gid})]\n")
+def fetch_project_name(projects_api, project_gid, limiter, cache=None):
+    """Asana プロジェクト名を取得する
 
-    notes = (task.get('notes') or '').strip()
-    if notes:
-        lines = notes.splitlines()
-        max_lines = 3 if task.get('completed') else 10
-        if len(lines) > max_lines:
-            out_lines = lines[:max_lines] + ["..."]
-        else:
-            out_lines = lines
-        for l in out_lines:
-            f.write(f"    > {l}\n" if l else "    >\n")
-
-    subtasks = task.get('subtasks_data', [])
-    if subtasks:
-        for sub in subtasks:
-            sub_gid = sub['gid']
-            sub_check = 'x' if sub.get('completed') else ' '
-            sub_due = f" (Due: {sub.get('due_on')})" if sub.get('due_on') else ""
-            f.write(f"    - [{sub_check}] {sub['name']}{sub_due} [[Asana](https://app.asana.com/0/0/{sub_gid})]\n")
-
-    if not task.get('completed'):
-        f.write(f"    - <!-- Memo area for {gid} -->\n")
-        if gid in existing_memos and existing_memos[gid].strip():
-            f.write(existing_memos[gid])
-        else:
-            f.write("\n")
+    cache (ProjectMetadataCache) にあればリクエストせずにその名前を使う。
+    """
+    def fetch():
+        return call_asana(limiter, projects_api.get_project, project_gid, {'opt_fields': PROJECT_OPT_FIELDS})
+
+    if cache is not None:
+        fields, fresh = cache.get(project_gid)
+        if fields is not None:
+            if not fresh:
+                cache.refresh(project_gid, fetch)
+            return fields.get('name') or project_gid
+    try:
+        project = fetch()
+    except Exception as e:
+        print(f"  WARNING: Failed to fetch project name for {project_gid}: {e}")
+        return project_gid
+    if cache is not None:
+        cache.put(project_gid, project)
+    return project.get('name', project_gid)
+
+
+def fetch_subtasks(tasks_api, task_gid, limiter):
+    """タスクのサブタスクを取得する"""
+    opts = {'opt_fields': SUBTASK_OPT_FIELDS}
+    try:
+        return call_asana(limiter, lambda: list(iterate_pages(limiter, tasks_api.get_subtasks_for_task(task_gid, opts),
+                                                              endpoint='get_subtasks_for_task')),
+                          endpoint='get_subtasks_for_task')
+    except Exception as e:
+        print(f"  WARNING: Failed to fetch subtasks for task {task_gid}: {e}")
+        return []
+
+
+def fetch_subtasks_batch(batch_api, tasks_api, task_gids, limiter):
+    """最大 BATCH_SIZE 件のタスクのサブタスクを Batch API の 1 リクエストで取得する
+
+    バッチ全体が失敗した場合や、個別のアクションがエラー・次ページありだった場合は、
+    そのタスクだけ従来の fetch_subtasks (1 タスク 1 リクエスト) で取得し直す。
+
+    Returns:
+        dict: {task_gid: [subtasks]}
+    """
+    body = {'data': {'actions': [
+        {
+            'method': 'get',
+            'relative_path': f'/tasks/{gid}/subtasks',
+            'options': {'fields': SUBTASK_OPT_FIELDS.split(','), 'limit': PAGE_SIZE},
+        }
+        for gid in task_gids
+    ]}}
+    results = {}
+    try:
+        # SDK v5 はページイテレータ (遅延) を返すため、POST が call_asana の再試行内で行われるよう list 化する
+        responses = call_asana(limiter, lambda: list(batch_api.create_batch_request(body, {})),
+                               endpoint='create_batch_request')
+    except Exception as e:
+        print(f"  WARNING: Batch subtask fetch failed, falling back to per-task requests: {e}")
+        responses = []
+    for gid, response in zip(task_gids, responses):
+        response_body = response.get('body') or {}
+        if (response.get('status_code') == 200 and isinstance(response_body.get('data'), list)
+                and not response_body.get('next_page')):
+            results[gid] = response_body['data']
+    for gid in task_gids:
+        if gid not in results:
+            results[gid] = fetch_subtasks(tasks_api, gid, limiter)
+    return results
+
+
+class TaskSnapshot:
+    """インクリメンタル同期用のローカルスナップショット (SQLite)
+
+    Asana プロジェクトごとに、担当/コラボのタスク (GID・modified_at・並び順・内容) と
+    サブタスク、最終同期時刻を保持する。2 回目以降は modified_since で更新分だけを取得し、
+    スナップショットにマージする。並び順と、削除・移動されたタスクは GID だけの一覧
+    (fetch_task_order) で合わせるので、出力は全件取得と同じになる。
+
+    サブタスクだけの変更は modified_since では検出できないため、full_resync_hours ごと
+    (または --full 指定時) に全件取得してスナップショットを作り直す。
+    """
+
+    def __init__(self, path=SNAPSHOT_DB, full_resync_hours=DEFAULT_FULL_RESYNC_HOURS, scope=None):
+        self.path = path
+        self.full_resync_hours = full_resync_hours
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                project_gid TEXT NOT NULL,
+                gid TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                modified_at TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (project_gid, gid)
+            );
+            CREATE TABLE IF NOT EXISTS subtasks (
+                parent_gid TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS projects (
+                project_gid TEXT PRIMARY KEY,
+                last_sync TEXT NOT NULL,
+                last_full_sync TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        # 保持しているタスクは scope (対象ユーザーの GID) で絞り込んだもの。変わったら全件取り直す
+        if scope is not None:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'scope'").fetchone()
+            if row is None or row[0] != scope:
+                self.conn.execute("DELETE FROM projects")
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scope', ?)", (scope,))
+                self.conn.commit()
+
+    def modified_since(self, project_gid, force_full=False):
+        """前回同期時刻を返す。全件取得が必要な場合は None"""
+        if force_full:
+            return None
+        row = self.conn.execute(
+            "SELECT last_sync, last_full_sync FROM projects WHERE project_gid = ?", (project_gid,)
+        ).fetchone()
+        if row is None:
+            return None
+        last_full = datetime.fromisoformat(row[1])
+        if datetime.now(timezone.utc) - last_full > timedelta(hours=self.full_resync_hours):
+            return None
+        return row[0]
+
+    def merge(self, project_gid, mine, other_gids, full, order=None):
+        """取得結果をスナップショットへ反映し、表示対象のタスク一覧を返す
+
+        Args:
+            mine: 今回取得した担当/コラボのタスク (full なら全件、そうでなければ更新分)
+            other_gids: 今回取得したそれ以外のタスクの GID (スナップショットから除く)
+            full: 全件取得だったか
+            order: プロジェクトの現在の全タスク GID (Asana の並び順)。渡すと並び順を
+                これに合わせ、含まれないタスク (削除・移動・表示期間外の完了) を除く
+        """
+        cur = self.conn.cursor()
+        if full:
+            cur.execute("DELETE FROM tasks WHERE project_gid = ?", (project_gid,))
+        positions = dict(cur.execute(
+            "SELECT gid, position FROM tasks WHERE project_gid = ?", (project_gid,)
+        ).fetchall())
+        next_position = max(positions.values(), default=-1) + 1
+        cur.executemany("DELETE FROM tasks WHERE project_gid = ? AND gid = ?",
+                        [(project_gid, gid) for gid in other_gids])
+        for t in mine:
+            position = positions.get(t['gid'])
+            if position is None:
+                position = next_position
+                next_position += 1
+            data = {k: v for k, v in t.items() if k != 'subtasks_data'}
+            cur.execute(
+                "INSERT OR REPLACE INTO tasks (project_gid, gid, position, modified_at, data) VALUES (?, ?, ?, ?, ?)",
+                (project_gid, t['gid'], position, t.get('modified_at'), json.dumps(data, ensure_ascii=False)),
+            )
+        if order is not None:
+            rank = {gid: i for i, gid in enumerate(order)}
+            stored = [gid for (gid,) in cur.execute("SELECT gid FROM tasks WHERE project_gid = ?", (project_gid,))]
+            cur.executemany("DELETE FROM tasks WHERE project_gid = ? AND gid = ?",
+                            [(project_gid, gid) for gid in stored if gid not in rank])
+            cur.executemany("UPDATE tasks SET position = ? WHERE project_gid = ? AND gid = ?",
+                            [(rank[gid], project_gid, gid) for gid in stored if gid in rank])
+        if full:
+            return list(mine)
+
+        cutoff = completed_cutoff()
+        tasks = []
+        for (data,) in cur.execute(
+            "SELECT data FROM tasks WHERE project_gid = ? ORDER BY position", (project_gid,)
+        ):
+            t = json.loads(data)
+            if t.get('completed') and (t.get('completed_at') or '') < cutoff:
+                continue
+            tasks.append(t)
+        return tasks
+
+    def load_subtasks(self, parent_gids):
+        """保存済みサブタスクを返す: {parent_gid: [subtasks]}"""
+        result = {}
+        for gid in parent_gids:
+            row = self.conn.execute("SELECT data FROM subtasks WHERE parent_gid = ?", (gid,)).fetchone()
+            if row is not None:
+                result[gid] = json.loads(row[0])
+        return result
+
+    def store_subtasks(self, parent_gid, subtasks):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO subtasks (parent_gid, data) VALUES (?, ?)",
+            (parent_gid, json.dumps(subtasks, ensure_ascii=False)),
+        )
+
+    def mark_synced(self, project_gid, started_at, full):
+        """同期成功を記録する (started_at は取得開始時刻)"""
+        row = self.conn.execute(
+            "SELECT last_full_sync FROM projects WHERE project_gid = ?", (project_gid,)
+        ).fetchone()
+        last_full = started_at if full or row is None else row[0]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO projects (project_gid, last_sync, last_full_sync) VALUES (?, ?, ?)",
+            (project_gid, started_at, last_full),
+        )
 
+    def commit(self):
+        self.conn.commit()
 
-def write_project_section(f, project_name, project_gid, tasks, user_gid, existing_memos):
-    """Asana プロジェクト単位のセクションを出力する"""
+    def close(self):
+        self.conn.close()
+
+
+def fetch_task_order(tasks_api, project_gid, limiter):
+    """プロジェクトの現在のタスク GID を Asana の並び順で返す (GID だけの軽い一覧、失敗時は例外を送出)
+
+    インクリメンタル同期で、更新分をマージした後の並びを全件取得と同じにするのに使う。
+    対象期間は fetch_task_list と同じ (未完了と直近7日間に完了したタスク)。
+    """
+    opts = {'project': project_gid, 'opt_fields': 'gid', 'completed_since': completed_cutoff(), 'limit': PAGE_SIZE}
+    return call_asana(limiter, lambda: [t['gid'] for t in iterate_pages(limiter, tasks_api.get_tasks(opts),
+                                                                        endpoint='get_tasks')],
+                      endpoint='get_tasks')
+
+
+def fetch_asana_project(tasks_api, projects_api, limiter, project_gid, user_gid, modified_since=None,
+                        project_cache=None, opt_fields=TASK_OPT_FIELDS):
+    """Asana プロジェクト 1 件の名前と、担当/コラボのタスクを取得する
+
+    Returns:
+        tuple: (asana_project_name, mine, other_gids, order)
+            other_gids は担当/コラボ以外のタスク GID。取得に失敗した場合は None
+            order はインクリメンタル取得時のプロジェクト全体の並び (fetch_task_order)。全件取得なら None
+    """
+    start = time.perf_counter()
+    asana_proj_name = fetch_project_name(projects_api, project_gid, limiter, project_cache)
+    order = None
+    try:
+        mine, other_gids = fetch_task_list(tasks_api, project_gid, limiter, user_gid, modified_since, opt_fields)
+        if modified_since:
+            # 更新分の取得後に一覧を取る (間に作られたタスクは次回の更新分として取得される)
+            order = fetch_task_order(tasks_api, project_gid, limiter)
+    except Exception as e:
+        print(f"  WARNING: Failed to fetch tasks for project {project_gid}: {e}")
+        METRICS.project(project_gid, name=asana_proj_name, seconds=round(time.perf_counter() - start, 3), ok=False)
+        return asana_proj_name, [], None, None
+    METRICS.project(project_gid, name=asana_proj_name, seconds=round(time.perf_counter() - start, 3), ok=True,
+                    tasks=len(mine), other_tasks=len(other_gids), incremental=bool(modified_since))
+    return asana_proj_name, mine, other_gids, order
+
+
+def fetch_all(tasks_api, projects_api, batch_api, limiter, project_gids, user_gid, workers,
+              snapshot=None, force_full=False, project_cache=None, opt_fields=TASK_OPT_FIELDS):
+    """複数の Asana プロジェクトのタスクとサブタスクを並行取得する
+
+    同じ GID のプロジェクト・タスクは 1 回だけ取得する。結果は入力順に依存せず
+    直列取得と同じ内容になる。batch_api を渡すとサブタスクを Batch API でまとめて取得し、
+    None なら 1 タスク 1 リクエストで取得する。
+
+    snapshot (TaskSnapshot) を渡すとインクリメンタル同期になる。更新されたタスクだけを
+    取得してマージし、サブタスクも更新されたタスクの分だけ取り直す。取得に失敗した
+    プロジェクトはスナップショットの内容をそのまま使う。
+
+    project_cache (ProjectMetadataCache) を渡すと、プロジェクト名はキャッシュから取得する。
+
+    Returns:
+        dict: {project_gid: (asana_project_name, tasks)}
+    """
+    unique_gids = list(dict.fromkeys(project_gids))
+    started_at = (datetime.now(timezone.utc) - timedelta(seconds=MODIFIED_SINCE_MARGIN_SECONDS)).isoformat()
+    since = {gid: snapshot.modified_since(gid, force_full) if snapshot else None for gid in unique_gids}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        with METRICS.phase('fetch/tasks'):
+            futures = [pool.submit(fetch_asana_project, tasks_api, projects_api, limiter, gid, user_gid, since[gid],
+                                   project_cache, opt_fields)
+                       for gid in unique_gids]
+            fetched = {gid: f.result() for gid, f in zip(unique_gids, futures)}
+
+        results = {}
+        refresh = []  # サブタスクを取得し直す親タスク
+        for gid, (name, mine, other_gids, order) in fetched.items():
+            if snapshot is None:
+                results[gid] = (name, mine)
+                refresh.extend(mine)
+                continue
+            full = since[gid] is None and other_gids is not None
+            if other_gids is None:
+                # 取得失敗: 前回のスナップショットで代用する
+                mine, other_gids = [], []
+            merged = snapshot.merge(gid, mine, other_gids, full, order)
+            results[gid] = (name, merged)
+            changed = {t['gid'] for t in mine}
+            refresh.extend(t for t in merged if t['gid'] in changed)
+            stored = snapshot.load_subtasks(
+                [t['gid'] for t in merged if t['gid'] not in changed and t.get('num_subtasks', 0) > 0]
+            )
+            for t in merged:
+                if t['gid'] in stored:
+                    t['subtasks_data'] = stored[t['gid']]
+
+        with METRICS.phase('fetch/subtasks'):
+            # サブタスクは親タスク GID ごとに 1 回だけ取得し、同じタスクの全コピーに設定する
+            parents = {}
+            for t in refresh:
+                if t.get('num_subtasks', 0) > 0:
+                    parents.setdefault(t['gid'], []).append(t)
+            parent_gids = list(parents)
+            METRICS.count('subtask_parents', len(parent_gids))
+            if batch_api is not None:
+                chunks = [parent_gids[i:i + BATCH_SIZE] for i in range(0, len(parent_gids), BATCH_SIZE)]
+                sub_futures = [pool.submit(fetch_subtasks_batch, batch_api, tasks_api, chunk, limiter)
+                               for chunk in chunks]
+            else:
+                sub_futures = [pool.submit(lambda gid: {gid: fetch_subtasks(tasks_api, gid, limiter)}, gid)
+                               for gid in parent_gids]
+            for f in sub_futures:
+                for gid, subtasks in f.result().items():
+                    for t in parents[gid]:
+                        t['subtasks_data'] = subtasks
+                    if snapshot is not None:
+                        snapshot.store_subtasks(gid, subtasks)
+
+    if snapshot is not None:
+        for gid, (_, _, other_gids, _) in fetched.items():
+            if other_gids is not None:
+                snapshot.mark_synced(gid, started_at, since[gid] is None)
+        snapshot.commit()
+    return results
+
+
+def write_task_line(f, view, existing_memos, body=None):
+    """タスクの1行 (とノート・サブタスク・メモ欄) を出力する (body はトークン予算で縮小した本文)"""
+    f.write(body or view.body)
+    if not view.completed:
+        f.write(f"    - <!-- Memo area for {view.gid} -->\n")
+        memo = existing_memos.get(view.gid)
+        f.write(memo if memo and memo.strip() else "\n")
+
+
+def write_project_section(f, project_name, project_gid, tasks, existing_memos, overrides=None):
+    """Asana プロジェクト単位のセクションを出力する (tasks は TaskView のリスト)
+
+    overrides: {id(view): 縮小した本文 (None なら省略)} (TokenBudget)
+    """
     if project_gid:
         f.write(f"## [{project_name}](https://app.asana.com/0/{project_gid}/list)\n\n")
     else:
         f.write(f"## {project_name}\n\n")
 
-    tasks = deduplicate_tasks(tasks)
-    in_progress = [t for t in tasks if not t.get('completed')]
-    completed = [t for t in tasks if t.get('completed')]
+    in_progress, completed = split_tasks(tasks)
+    overrides = overrides or {}
+    completed = [v for v in completed if overrides.get(id(v), v.body) is not None]
 
     # 進行中タスク
     f.write("### 進行中\n\n")
     if in_progress:
-        for task in sorted(in_progress, key=lambda t: task_sort_key(t, user_gid)):
-            role = classify_task_role(task, user_gid)
-            write_task_line(f, task, role, existing_memos)
+        for view in in_progress:
+            write_task_line(f, view, existing_memos, overrides.get(id(view)))
     else:
         f.write("(タスクなし)\n\n")
 
     # 完了タスク
     f.write("### 完了 (直近)\n\n")
     if completed:
-        for task in completed:
-            role = classify_task_role(task, user_gid)
-            write_task_line(f, task, role, existing_memos)
+        for view in completed:
+            write_task_line(f, view, existing_memos, overrides.get(id(view)))
     else:
         f.write("(タスクなし)\n")
 
     f.write("\n")
 
 
-def write_project_file(output_path, project_name, sections, personal_tasks, user_gid):
+class TokenBudget:
+    """ファイルごとのトークン予算 (config.json の "token_budget")
+
+    予算を超えるファイルは、順位 (sort_key: 役割 → 期限) の低いタスクから段階的に縮小する:
+    完了タスクを省く → ノートを 3 行に → ノートを省く → サブタスクを省く。
+    進行中タスクの行とメモ欄はそのまま残す。省略した内容は最初の '##' の前に注記する。
+    トークン数は get_tokens.py の count_tokens で数える。
+    """
+
+    def __init__(self, limit, token_counter, encoding=DEFAULT_MANIFEST_ENCODING):
+        self.limit = limit
+        self.token_counter = token_counter
+        self.encoding = encoding
+
+    def count(self, text):
+        return self.token_counter.count_tokens(text, self.encoding) if text else 0
+
+    def candidates(self, views):
+        """縮小の候補 (view, 縮小後の本文, 種類) を適用する順に返す"""
+        in_progress, completed = split_tasks(views)
+        # 完了タスクは Asana の並びのまま出力するが、省く順は進行中と同じ順位 (役割 → 期限) の低い順
+        for view in reversed(sorted(completed, key=sort_key)):
+            yield view, None, '完了タスク'
+        lowest_first = list(reversed(in_progress))
+        for view in lowest_first:
+            yield view, render_task_body(view.task, view.role, view.anken, max_notes=3), 'ノート'
+        for view in lowest_first:
+            yield view, render_task_body(view.task, view.role, view.anken, max_notes=0), 'ノート'
+        for view in lowest_first:
+            yield view, render_task_body(view.task, view.role, view.anken, max_notes=0, subtasks=False), 'サブタスク'
+
+    def marker(self, elided, tokens=None):
+        parts = "、".join(f"{kind} {len(gids)} 件" for kind, gids in elided.items() if gids) or "なし"
+        over = f" (縮小後も {tokens} tokens で予算を超えています)" if tokens is not None else ""
+        return (f"> トークン予算 ({self.limit} tokens) に収めるため省略: {parts}{over}。"
+                f"全文は Asana を参照してください。\n\n")
+
+    def fit(self, render, views):
+        """render(overrides, marker) の出力が予算に収まるまで縮小し、その内容を返す"""
+        content = render()
+        total = self.count(content)
+        if total <= self.limit:
+            return content
+        overrides = {}
+        elided = {'完了タスク': set(), 'ノート': set(), 'サブタスク': set()}
+        estimate = total
+        for view, body, kind in self.candidates(views):
+            current = overrides.get(id(view), view.body)
+            saving = self.count(current) - self.count(body)
+            if saving <= 0:
+                continue
+            overrides[id(view)] = body
+            elided[kind].add(view.gid)
+            estimate -= saving
+            if estimate <= self.limit:
+                # 本文ごとの合計は概算なので、ファイル全体を数え直して確かめる
+                content = render(overrides, self.marker(elided))
+                estimate = total = self.count(content)
+                if total <= self.limit:
+                    return content
+        content = render(overrides, self.marker(elided))
+        total = self.count(content)
+        if total > self.limit:
+            # 注記に書く数は注記自身を含めたファイル全体のトークン数にする
+            # (書き込んだ数字で数が変わることがあるので、一致するまで数え直す)
+            for _ in range(5):
+                content = render(overrides, self.marker(elided, total))
+                counted = self.count(content)
+                if counted == total:
+                    break
+                total = counted
+            log(f"  WARNING: Over token budget after shrinking ({counted} > {self.limit} tokens)")
+        return content
+
+
+def content_hash(text):
+    """'Last Sync:' 行を除いた内容のハッシュ (同期時刻だけの差分を変更とみなさない)"""
+    digest = hashlib.sha256()
+    for line in text.splitlines(keepends=True):
+        if not line.startswith('Last Sync: '):
+            digest.update(line.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def write_output(output_path, content, manifest=None):
+    """レンダリング済みの内容を、既存ファイルから変わった場合だけ書き込む
+
+    一時ファイルに書いてから置き換えるため、同期途中の中身が Box や Obsidian から
+    見えることはない。manifest (OutputManifest) を渡すと、ディスク上の内容を記録する。
+
+    Returns:
+        bool: 書き込んだ場合 True、内容が同じでスキップした場合 False
+    """
+    try:
+        with open(output_path, 'rb') as f:
+            existing = f.read()
+        # テキストモードで読んだ場合と同じ改行の正規化
+        existing_text = existing.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        if content_hash(existing_text) == content_hash(content):
+            METRICS.file(False, len(content.encode('utf-8')))
+            if manifest is not None:
+                manifest.record(output_path, existing, existing_text)
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    tmp_path = os.path.join(output_dir, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    try:
+        os.replace(tmp_path, output_path)
+    except PermissionError:
+        # 他プロセス (Box Drive / Obsidian) がファイルをロック中の場合は直接上書きする
+        os.remove(tmp_path)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    METRICS.file(True, len(content.encode('utf-8')))
+    if manifest is not None:
+        # テキストモードの書き込みは '\n' を os.linesep に変換する
+        manifest.record(output_path, content.replace('\n', os.linesep).encode('utf-8'), content)
+    return True
+
+
+def load_token_counter(path=TOKEN_SCRIPT):
+    """get_tokens.py をモジュールとして読み込む (見つからなければ None)"""
+    import importlib.util
+
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location('get_tokens', path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception as e:
+        print(f"  WARNING: Failed to load {path}: {e}")
+        return None
+    return module
+
+
+class OutputManifest:
+    """出力ファイルの一覧 (asana-tasks-manifest.json)
+
+    ファイルごとにパス (マニフェストからの相対パス)・サイズ・mtime・sha256・
+    進行中/完了タスク数・トークン数を記録する。ダッシュボードや get_tokens.py --manifest は
+    sha256 が一致する間はファイルを読み直さずにこの値を使える。
+    トークン数は get_tokens.py の count_tokens と同じエンコーディングで数え、
+    前回のマニフェストと sha256 が同じファイルは前回の値を使う。
+    """
+
+    def __init__(self, path, encoding=DEFAULT_MANIFEST_ENCODING, token_counter=None):
+        self.path = path
+        self.root = os.path.dirname(path)
+        self.encoding = encoding
+        self.token_counter = token_counter
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.previous = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.previous = {entry['path']: entry for entry in data.get('files', [])}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def relative(self, output_path):
+        try:
+            return os.path.relpath(output_path, self.root).replace(os.sep, '/')
+        except ValueError:  # 別ドライブ
+            return output_path
+
+    def record(self, output_path, data, text):
+        """ディスク上の内容 (data: bytes, text: 改行を正規化した文字列) を記録する"""
+        st = os.stat(output_path)
+        entry = {
+            'path': self.relative(output_path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'in_progress': 0,
+            'completed': 0,
+            'tokens': None,
+        }
+        # タスク行は行頭のチェックボックスだけ (サブタスクは字下げ、メモ欄には入らない)
+        for line in text.splitlines():
+            if line.startswith('- [ ] '):
+                entry['in_progress'] += 1
+            elif line.startswith('- [x] '):
+                entry['completed'] += 1
+        previous = self.previous.get(entry['path'])
+        if previous and previous.get('sha256') == entry['sha256'] and previous.get('encoding') == self.encoding:
+            entry['tokens'] = previous.get('tokens')
+        elif self.token_counter is not None:
+            tokens = self.token_counter.count_tokens(text, self.encoding)
+            entry['tokens'] = tokens if tokens >= 0 else None
+        entry['encoding'] = self.encoding if entry['tokens'] is not None else None
+        with self.lock:
+            self.entries[entry['path']] = entry
+
+    def save(self, keep_previous=False):
+        """マニフェストを書き出す。keep_previous なら今回出力しなかったファイルの記録も残す"""
+        files = dict(self.previous) if keep_previous else {}
+        files.update(self.entries)
+        data = {
+            'version': MANIFEST_VERSION,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'files': [files[key] for key in sorted(files)],
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  WARNING: Failed to write {self.path}: {e}")
+
+
+_thread_log = threading.local()
+
+
+def log(message):
+    """ログを出力する。並行書き出し中はスレッドごとのバッファに溜め、案件の順に表示する"""
+    print(message, file=getattr(_thread_log, 'buffer', None) or sys.stdout)
+
+
+def report_output(output_path, written):
+    """出力結果を表示する"""
+    if written:
+        log(f"  Output: {output_path}")
+    else:
+        log(f"  Unchanged: {output_path}")
+    return written
+
+
+def run_logged(func, *args, **kwargs):
+    """func を実行し (結果, ログ, 例外) を返す (並行書き出し用。例外は呼び出し側で報告する)"""
+    buffer = _thread_log.buffer = io.StringIO()
+    try:
+        return func(*args, **kwargs), buffer.getvalue(), None
+    except Exception as e:
+        return None, buffer.getvalue(), e
+    finally:
+        _thread_log.buffer = None
+
+
+def write_project_file(output_path, project_name, sections, personal_tasks, memos=None, manifest=None, budget=None):
     """案件別の asana-tasks.md を出力する
 
     Args:
         output_path: 出力先ファイルパス
         project_name: 案件名
-        sections: [(asana_project_name, [tasks]), ...] Asana プロジェクトごとのタスク
-        personal_tasks: 個人プロジェクトから振り分けられたタスク
-        user_gid: 自分の Asana ユーザー GID
+        sections: [(asana_project_name, project_gid, [TaskView]), ...] Asana プロジェクトごとのタスク
+        personal_tasks: 個人プロジェクトから振り分けられたタスク (TaskView)
+        memos: 既存メモの MemoStore (省略時は output_path から読み込む)
+        manifest: 出力を記録する OutputManifest (省略可)
+        budget: ファイルごとのトークン予算 (TokenBudget、省略可)
+
+    Returns:
+        bool: ファイルを書き込んだ場合 True (内容に変化がなければ False)
     """
-    existing_memos = load_existing_memos(output_path)
+    existing_memos = (memos or MemoStore()).memos_for(output_path)
+    last_sync = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
+    def render(overrides=None, marker=""):
+        with io.StringIO() as f:
+            f.write(f"# Asana Tasks: {project_name}\n")
+            f.write(f"Last Sync: {last_sync}\n\n")
+            f.write(f"> このファイルは sync_from_asana.py により自動生成されます。\n")
+            f.write(f"> 'Memo area' 以下の記述は保持されます。\n\n")
+            f.write(marker)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(f"# Asana Tasks: {project_name}\n")
-        f.write(f"Last Sync: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write(f"> このファイルは sync_from_asana.py により自動生成されます。\n")
-        f.write(f"> 'Memo area' 以下の記述は保持されます。\n\n")
+            # Asana プロジェクトごとのセクション
+            for asana_project_name, project_gid, tasks in sections:
+                write_project_section(f, asana_project_name, project_gid, tasks, existing_memos, overrides)
 
-        # Asana プロジェクトごとのセクション
-        for asana_project_name, project_gid, tasks in sections:
-            write_project_section(f, asana_project_name, project_gid, tasks, user_gid, existing_memos)
+            # 個人タスクからの振り分け
+            if personal_tasks:
+                write_project_section(f, "個人タスクより", None, personal_tasks, existing_memos, overrides)
 
-        # 個人タスクからの振り分け
-        if personal_tasks:
-            write_project_section(f, "個人タスクより", None, personal_tasks, user_gid, existing_memos)
+            return f.getvalue()
 
-    print(f"  Output: {output_path}")
+    if budget is None:
+        content = render()
+    else:
+        views = [v for _, _, tasks in sections for v in tasks] + list(personal_tasks)
+        content = budget.fit(render, views)
 
+    return report_output(output_path, write_output(output_path, content, manifest))
 
-def write_personal_file(output_path, tasks, user_gid):
-    """個人/未分類タスクの asana-tasks-personal.md を出力する"""
-    existing_memos = load_existing_memos(output_path)
 
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
+def write_personal_file(output_path, tasks, memos=None, manifest=None, budget=None):
+    """個人/未分類タスクの asana-tasks-personal.md を出力する
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(f"# Asana Tasks: 個人 / 未分類\n")
-        f.write(f"Last Sync: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        f.write(f"> このファイルは sync_from_asana.py により自動生成されます。\n")
-        f.write(f"> 'Memo area' 以下の記述は保持されます。\n\n")
+    Returns:
+        bool: ファイルを書き込んだ場合 True (内容に変化がなければ False)
+    """
+    existing_memos = (memos or MemoStore()).memos_for(output_path)
+    last_sync = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    in_progress, completed = split_tasks(tasks)
+
+    def render(overrides=None, marker=""):
+        overrides = overrides or {}
+        shown = [v for v in completed if overrides.get(id(v), v.body) is not None]
+        with io.StringIO() as f:
+            f.write(f"# Asana Tasks: 個人 / 未分類\n")
+            f.write(f"Last Sync: {last_sync}\n\n")
+            f.write(f"> このファイルは sync_from_asana.py により自動生成されます。\n")
+            f.write(f"> 'Memo area' 以下の記述は保持されます。\n\n")
+            f.write(marker)
+
+            f.write("## 進行中\n\n")
+            if in_progress:
+                for view in in_progress:
+                    write_task_line(f, view, existing_memos, overrides.get(id(view)))
+            else:
+                f.write("(タスクなし)\n\n")
 
-        tasks = deduplicate_tasks(tasks)
-        in_progress = [t for t in tasks if not t.get('completed')]
-        completed = [t for t in tasks if t.get('completed')]
+            f.write("## 完了 (直近)\n\n")
+            if shown:
+                for view in shown:
+                    write_task_line(f, view, existing_memos, overrides.get(id(view)))
+            else:
+                f.write("(タスクなし)\n")
 
-        f.write("## 進行中\n\n")
-        if in_progress:
-            for task in sorted(in_progress, key=lambda t: task_sort_key(t, user_gid)):
-                role = classify_task_role(task, user_gid)
-                write_task_line(f, task, role, existing_memos)
-        else:
-            f.write("(タスクなし)\n\n")
+            return f.getvalue()
 
-        f.write("## 完了 (直近)\n\n")
-        if completed:
-            for task in completed:
-                role = classify_task_role(task, user_gid)
-                write_task_line(f, task, role, existing_memos)
-        else:
-            f.write("(タスクなし)\n")
+    content = render() if budget is None else budget.fit(render, tasks)
+    return report_output(output_path, write_output(output_path, content, manifest))
+
+
+def summary_toc_line(project_name, sections, personal_tasks):
+    """グローバルサマリーの目次 1 行"""
+    total_in_progress = sum(
+        sum(1 for v in tasks if not v.completed)
+        for _, _, tasks in sections
+    )
+    total_in_progress += sum(1 for v in personal_tasks if not v.completed)
+    anchor = project_name.replace(' ', '-').replace('(', '').replace(')', '').replace('[', '').replace(']', '')
+    return f"- [{project_name}](#{anchor}) (進行中: {total_in_progress})\n"
 
-    print(f"  Output: {output_path}")
 
+def write_summary_section(f, project_name, sections, personal_tasks, existing_memos):
+    """グローバルサマリーの案件セクション (進行中タスクのみ) を出力する"""
+    f.write(f"## {project_name}\n\n")
 
-def write_global_summary(output_path, all_project_data, personal_tasks, user_gid):
+    all_tasks = []
+    for asana_proj_name, asana_project_gid, tasks in sections:
+        all_tasks.extend(tasks)
+    all_tasks.extend(personal_tasks)
+    in_progress, _ = split_tasks(all_tasks)
+    if in_progress:
+        for view in in_progress:
+            write_task_line(f, view, existing_memos)
+    else:
+        f.write("(タスクなし)\n\n")
+
+    f.write("\n")
+
+
+def write_global_summary(output_path, all_project_data, personal_tasks, memos=None, manifest=None):
     """全案件のグローバルサマリー (asana-tasks-view.md) を出力する
 
     Args:
         output_path: 出力先ファイルパス
         all_project_data: [(project_name, sections, personal_tasks_for_project), ...]
-        personal_tasks: 未分類の個人タスク
-        user_gid: 自分の Asana ユーザー GID
-    """
-    existing_memos = load_existing_memos(output_path)
+        personal_tasks: 未分類の個人タスク (TaskView)
+        memos: 既存メモの MemoStore (省略時は output_path から読み込む)
+        manifest: 出力を記録する OutputManifest (省略可)
 
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
+    Returns:
+        bool: ファイルを書き込んだ場合 True (内容に変化がなければ False)
+    """
+    existing_memos = (memos or MemoStore()).memos_for(output_path)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with io.StringIO() as f:
         f.write(f"# Asana Tasks View (All Projects)\n")
         f.write(f"Last Sync: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"> このファイルは sync_from_asana.py により自動生成されます。\n")
@@ -420,154 +1669,431 @@ def write_global_summary(output_path, all_project_data, personal_tasks, user_gid
         # 目次
         f.write("## 目次\n\n")
         for project_name, sections, proj_personal in all_project_data:
-            total_in_progress = sum(
-                len([t for t in tasks if not t.get('completed')])
-                for _, _, tasks in sections
-            )
-            total_in_progress += len([t for t in proj_personal if not t.get('completed')])
-            anchor = project_name.replace(' ', '-').replace('(', '').replace(')', '').replace('[', '').replace(']', '')
-            f.write(f"- [{project_name}](#{anchor}) (進行中: {total_in_progress})\n")
+            f.write(summary_toc_line(project_name, sections, proj_personal))
         if personal_tasks:
-            f.write(f"- [個人 / 未分類](#個人--未分類) (進行中: {len([t for t in personal_tasks if not t.get('completed')])})\n")
+            f.write(f"- [個人 / 未分類](#個人--未分類) (進行中: {sum(1 for v in personal_tasks if not v.completed)})\n")
         f.write("\n---\n\n")
 
         # 各案件セクション
         for project_name, sections, proj_personal in all_project_data:
-            f.write(f"## {project_name}\n\n")
-
-            all_tasks = []
-            for asana_proj_name, asana_project_gid, tasks in sections:
-                all_tasks.extend(tasks)
-            all_tasks.extend(proj_personal)
-            all_tasks = deduplicate_tasks(all_tasks)
-
-            in_progress = [t for t in all_tasks if not t.get('completed')]
-            if in_progress:
-                for task in sorted(in_progress, key=lambda t: task_sort_key(t, user_gid)):
-                    role = classify_task_role(task, user_gid)
-                    write_task_line(f, task, role, existing_memos)
-            else:
-                f.write("(タスクなし)\n\n")
-
-            f.write("\n")
+            write_summary_section(f, project_name, sections, proj_personal, existing_memos)
 
         # 個人/未分類
         if personal_tasks:
             f.write("## 個人 / 未分類\n\n")
-            in_progress = [t for t in personal_tasks if not t.get('completed')]
+            in_progress = sorted((v for v in personal_tasks if not v.completed), key=sort_key)
             if in_progress:
-                for task in sorted(in_progress, key=lambda t: task_sort_key(t, user_gid)):
-                    role = classify_task_role(task, user_gid)
-                    write_task_line(f, task, role, existing_memos)
+                for view in in_progress:
+                    write_task_line(f, view, existing_memos)
             else:
                 f.write("(タスクなし)\n")
             f.write("\n")
 
-    print(f"  Output: {output_path}")
+        content = f.getvalue()
+
+    return report_output(output_path, write_output(output_path, content, manifest))
+
+
+def patch_global_summary(output_path, project_data, memos=None, manifest=None):
+    """既存のグローバルサマリーのうち、指定案件の目次行とセクションだけを差し替える (--project 用)
+
+    他の案件・個人/未分類のセクションは既存ファイルの内容をそのまま残す。
+
+    Args:
+        output_path: グローバルサマリーのパス
+        project_data: [(project_name, sections, personal_tasks_for_project), ...] 差し替える案件
+        memos: 既存メモの MemoStore (省略時は output_path から読み込む)
+        manifest: 出力を記録する OutputManifest (省略可)
+
+    Returns:
+        bool | None: 書き込んだら True、変化がなければ False。
+            ファイルや案件のセクションが見つからず差し替えられない場合は None
+    """
+    try:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+    existing_memos = (memos or MemoStore()).memos_for(output_path)
+
+    for project_name, sections, proj_personal in project_data:
+        toc_prefix = f"- [{project_name}](#"
+        heading = f"## {project_name}\n"
+        toc = next((i for i, line in enumerate(lines) if line.startswith(toc_prefix)), None)
+        start = next((i for i, line in enumerate(lines) if line == heading), None)
+        if toc is None or start is None:
+            return None
+        # セクションは次の "## " 見出しまで (メモ欄に '#' で始まる行は残らない)
+        end = next((i for i in range(start + 1, len(lines)) if lines[i].startswith('## ')), len(lines))
+        with io.StringIO() as f:
+            write_summary_section(f, project_name, sections, proj_personal, existing_memos)
+            lines[start:end] = f.getvalue().splitlines(keepends=True)
+        lines[toc] = summary_toc_line(project_name, sections, proj_personal)
+
+    return report_output(output_path, write_output(output_path, ''.join(lines), manifest))
+
+
+class SyncSession:
+    """同期に使う設定・Asana API クライアント・キャッシュ
+
+    通常の実行では同期 1 回ごとに作って閉じる。--daemon では使い回し、API クライアントの
+    接続プール (TLS セッション)、プロジェクト名キャッシュ、メモの読み込み結果、
+    前回の取得結果 (案件単位の同期で他の案件の表示に使う) を保持する。
+    config.json / paths.json は変更されたときだけ読み直す。
+    """
+
+    def __init__(self):
+        self._signature = None
+        self._client_key = None
+        self.config = {}
+        self.paths = {}
+        self.user_gid = None  # 取得対象ユーザーの GID (チームモードではカンマ区切り)
+        self.tasks_api = None
+        self.projects_api = None
+        self.batch_api = None
+        self.limiter = None
+        self.project_cache = None
+        self.memo_files = {}
+        self.fetched = {}  # {asana_project_gid: (asana_project_name, tasks)}
+
+    def refresh(self):
+        """設定を (変更されていれば) 読み直し、必要なら API クライアントを作り直す"""
+        signature = []
+        for path in (CONFIG_PATH, PATHS_JSON):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        signature.append((os.environ.get('ASANA_TOKEN'), os.environ.get('ASANA_USER_GID')))
+        if signature == self._signature:
+            return
+
+        config = load_config()
+        paths = load_paths()
+        token = os.environ.get('ASANA_TOKEN', config.get('asana_token'))
+        if not token:
+            raise ValueError("ASANA_TOKEN environment variable or config.json with 'asana_token' is required")
+
+        user_gid = os.environ.get('ASANA_USER_GID', config.get('user_gid'))
+        if config.get('team_members'):
+            user_gid = ','.join(sorted(str(m.get('user_gid')) for m in config['team_members']))
+        elif not user_gid:
+            raise ValueError("'user_gid' is required in config.json or ASANA_USER_GID env var")
+
+        # --- Asana API クライアント初期化 ---
+        fetch_workers = int(config.get('fetch_workers', DEFAULT_FETCH_WORKERS))
+        base_url = config.get('asana_base_url')  # fake_asana_server.py などに向ける場合のみ指定
+        client_key = (token, fetch_workers, bool(config.get('subtask_batch', True)), base_url)
+        if client_key != self._client_key:
+            import asana  # --discover-only などは SDK なしで動くよう、必要になってから読み込む
+            configuration = asana.Configuration()
+            configuration.access_token = token
+            if base_url:
+                configuration.host = base_url.rstrip('/')
+            if hasattr(configuration, 'retry_strategy'):
+                # SDK 既定の urllib3 リトライ (429 を各スレッドで黙って再試行) を止め、
+                # 429 は call_asana が共有の Retry-After 停止で扱う
+                from urllib3.util.retry import Retry
+                configuration.retry_strategy = Retry(total=0, status_forcelist=[], respect_retry_after_header=False,
+                                                     raise_on_status=False)
+            if hasattr(configuration, 'connection_pool_maxsize'):
+                configuration.connection_pool_maxsize = max(configuration.connection_pool_maxsize,
+                                                            DEFAULT_FETCH_WORKERS, fetch_workers)
+            api_client = asana.ApiClient(configuration)
+            self.tasks_api = asana.TasksApi(api_client)
+            self.projects_api = asana.ProjectsApi(api_client)
+            # サブタスク取得に Batch API を使う (config.json の "subtask_batch": false で従来方式)
+            self.batch_api = asana.BatchAPIApi(api_client) if config.get('subtask_batch', True) else None
+            self._client_key = client_key
+
+        rate = float(config.get('max_requests_per_minute', DEFAULT_MAX_REQUESTS_PER_MINUTE))
+        if self.limiter is None or self.limiter.rate != rate / 60.0:
+            self.limiter = RateLimiter(rate)
+        # プロジェクト名は TTL 付きでキャッシュし、期限切れの分はバックグラウンドで取り直す
+        ttl_hours = float(config.get('project_name_ttl_hours', DEFAULT_PROJECT_NAME_TTL_HOURS))
+        if self.project_cache is None:
+            self.project_cache = ProjectMetadataCache(ttl_hours=ttl_hours)
+        self.project_cache.ttl = ttl_hours * 3600
+
+        if str(user_gid) != self.user_gid:
+            self.fetched = {}
+        self.config = config
+        self.paths = paths
+        self.user_gid = str(user_gid)
+        self._signature = signature
+
+    def close(self):
+        if self.project_cache is not None:
+            self.project_cache.close()
+            self.project_cache = None
+
+
+def sync_from_asana(incremental=None, full=False, session=None, project=None):
+    """メイン処理: Asana タスクを案件別に Obsidian Vault へ同期
+
+    フェーズごとの所要時間や API 呼び出し数を sync_metrics.json に書き出す
+    (config.json の "metrics_history" > 0 なら sync_metrics_history.jsonl にその件数まで保持)。
+
+    Args:
+        incremental: True で前回同期以降の更新分だけを取得する (None なら config.json の
+            "incremental_sync" に従う)
+        full: インクリメンタル同期でも全件取得してスナップショットを作り直す
+        session: 使い回す SyncSession (--daemon 用。None なら今回限りのセッションを作る)
+        project: 案件名を指定すると、その案件の Asana プロジェクトと個人プロジェクトだけを取得し直す。
+            他の案件は session に前回の取得結果があればそれを使い、なければ案件別ファイルは
+            その案件だけを書き直し、グローバルサマリーはその案件の目次行とセクションだけを差し替える
+    """
+    METRICS.reset()
+    own_session = session is None
+    if own_session:
+        session = SyncSession()
+    status = 'error'
+    try:
+        _sync_from_asana(session, incremental, full, project)
+        status = 'ok'
+    finally:
+        if own_session:
+            session.close()
+        metrics = METRICS.save(status, history_limit=int(session.config.get('metrics_history', 0)))
+    print("Timings: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in metrics['phases'].items()
+                                  if '/' not in name)
+          + f" / {metrics['requests_total']} API requests, {metrics['retries']} retries")
+    return metrics
+
+
+def team_members(config, paths):
+    """出力先ユーザーの一覧を返す
+
+    通常は config.json の user_gid / personal_project_gids と paths.json の obsidianVaultRoot の
+    1 人分。config.json に "team_members" があればチームモードになり、メンバーごとに
+    paths.json の "teamVaultRoots" (メンバー名 → Vault ルート) へ出力する。
+
+    Returns:
+        list: [{'name', 'user_gid', 'personal_project_gids', 'vault_root', 'output_file'}, ...]
+    """
+    team = config.get('team_members')
+    if not team:
+        vault_root = paths['obsidianVaultRoot']
+        output_file = os.environ.get('ASANA_OUTPUT_FILE', '')
+        if not output_file:
+            configured = config.get('output_file', '')
+            if configured and os.path.isdir(os.path.dirname(configured)):
+                output_file = configured
+            else:
+                output_file = os.path.join(vault_root, 'asana-tasks-view.md')
+        return [{
+            'name': None,
+            'user_gid': str(os.environ.get('ASANA_USER_GID', config.get('user_gid'))),
+            'personal_project_gids': config.get('personal_project_gids', []),
+            'vault_root': vault_root,
+            'output_file': output_file,
+        }]
+
+    vault_roots = paths.get('teamVaultRoots', {})
+    members = []
+    for member in team:
+        name = member.get('name')
+        if not name or not member.get('user_gid'):
+            raise ValueError(f"team_members entries need 'name' and 'user_gid': {member}")
+        vault_root = vault_roots.get(name)
+        if not vault_root:
+            print(f"  WARNING: No teamVaultRoots entry for {name} in paths.json, skipping")
+            continue
+        vault_root = os.path.expandvars(vault_root)
+        members.append({
+            'name': name,
+            'user_gid': str(member['user_gid']),
+            'personal_project_gids': member.get('personal_project_gids', []),
+            'vault_root': vault_root,
+            'output_file': os.path.join(vault_root, 'asana-tasks-view.md'),
+        })
+    return members
 
 
-def sync_from_asana():
-    """メイン処理: Asana タスクを案件別に Obsidian Vault へ同期"""
+def _sync_from_asana(session, incremental, full, project):
+    """sync_from_asana() の本体"""
     # --- 設定読み込み ---
-    config = load_config()
-    paths = load_paths()
-
-    token = os.environ.get('ASANA_TOKEN', config.get('asana_token'))
-    if not token:
-        raise ValueError("ASANA_TOKEN environment variable or config.json with 'asana_token' is required")
-
-    user_gid = os.environ.get('ASANA_USER_GID', config.get('user_gid'))
-    if not user_gid:
-        raise ValueError("'user_gid' is required in config.json or ASANA_USER_GID env var")
-    user_gid = str(user_gid)
-
-    box_projects_root = paths['boxProjectsRoot']
-    obsidian_vault_root = paths['obsidianVaultRoot']
-    personal_project_gids = config.get('personal_project_gids', [])
-    output_file = os.environ.get('ASANA_OUTPUT_FILE', '')
-    if not output_file:
-        configured = config.get('output_file', '')
-        if configured and os.path.isdir(os.path.dirname(configured)):
-            output_file = configured
-        else:
-            output_file = os.path.join(obsidian_vault_root, 'asana-tasks-view.md')
+    session.refresh()
+    config = session.config
+    if incremental is None:
+        incremental = bool(config.get('incremental_sync', False))
+
+    box_projects_root = session.paths['boxProjectsRoot']
+    members = team_members(config, session.paths)
+    user_gids = sorted({m['user_gid'] for m in members})
+    personal_project_gids = [gid for m in members for gid in m['personal_project_gids']]
 
-    # --- Asana API クライアント初期化 ---
-    configuration = asana.Configuration()
-    configuration.access_token = token
-    api_client = asana.ApiClient(configuration)
-    tasks_api = asana.TasksApi(api_client)
-    projects_api = asana.ProjectsApi(api_client)
+    fetch_workers = int(config.get('fetch_workers', DEFAULT_FETCH_WORKERS))
+    project_cache = session.project_cache
 
     # --- 案件検出 ---
     print("[1/5] Discovering projects with asana_config.json...")
     discovered = discover_projects(box_projects_root)
+    METRICS.lap('discover')
     if not discovered and not personal_project_gids:
         print("No projects with asana_config.json found and no personal projects configured.")
         return
+    # 個人タスクの振り分け用索引 (案件名・ベース名・エイリアス → 案件)
+    anken_index = build_anken_index(discovered)
 
     # --- 案件ごとにタスク取得 ---
     print("\n[2/5] Fetching tasks for each project...")
+    # 案件・個人プロジェクトの全 Asana プロジェクトを共有レートリミッタの下で並行取得する。
+    # チームモードでも各プロジェクトは 1 回だけ取得し、いずれかのメンバーの担当/コラボのタスクを残す
+    all_gids = [gid for proj in discovered for gid in proj['asana_config'].get('asana_project_gids', [])]
+    all_gids += personal_project_gids
+    configured_gids = set(all_gids)
+    selected = None
+    if project is not None:
+        key = normalize_anken(project)
+        selected = [p for p in discovered if key in (normalize_anken(p['name']), normalize_anken(p['relative_path']))]
+        if not selected:
+            raise ValueError(f"Project not found: {project}")
+        # 指定案件と個人プロジェクト (案件へ振り分けるタスクを含む) だけを取得する
+        target_gids = {gid for p in selected for gid in p['asana_config'].get('asana_project_gids', [])}
+        target_gids.update(personal_project_gids)
+        all_gids = [gid for gid in all_gids if gid in target_gids]
+    snapshot = None
+    if incremental:
+        snapshot = TaskSnapshot(full_resync_hours=float(config.get('full_resync_hours', DEFAULT_FULL_RESYNC_HOURS)),
+                                scope=','.join(user_gids))
+    mode = " (incremental)" if snapshot and not full else ""
+    team = f" for {len(members)} team members" if config.get('team_members') else ""
+    print(f"  Fetching {len(set(all_gids))} Asana projects ({fetch_workers} workers){mode}{team}...")
+    try:
+        session.fetched.update(fetch_all(
+            session.tasks_api, session.projects_api, session.batch_api, session.limiter, all_gids,
+            user_gids[0] if len(user_gids) == 1 else user_gids,
+            fetch_workers, snapshot=snapshot, force_full=full, project_cache=project_cache,
+            opt_fields=task_opt_fields(config)))
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+    # 設定から外れた Asana プロジェクトの取得結果は捨てる
+    fetched = session.fetched = {gid: v for gid, v in session.fetched.items() if gid in configured_gids}
+    METRICS.lap('fetch')
+    METRICS.count('fetched', sum(len(tasks) for _, tasks in fetched.values()))
+    # 他の案件の取得結果がなければ (デーモン外の --project)、指定案件の出力だけを更新する
+    if project is not None and configured_gids.issubset(fetched):
+        selected = None
+
+    # --- メンバーごとに振り分け・出力 (取得結果は共有する) ---
+    memo_merge = config.get('memo_merge', 'per-file')
+    # 出力ファイルのマニフェストとトークン予算 (トークン数は get_tokens.py と同じエンコーディングで数える)
+    encoding = config.get('manifest_encoding', DEFAULT_MANIFEST_ENCODING)
+    manifest_encoding = encoding if config.get('output_manifest', True) else None
+    token_budget = int(config.get('token_budget', 0))
+    token_counter = None
+    if manifest_encoding or token_budget > 0:
+        token_counter = load_token_counter()
+        if token_counter is not None:
+            try:
+                token_counter.get_encoding(encoding)
+            except Exception as e:
+                print(f"  WARNING: Cannot count tokens ({e}); token counts and token_budget are disabled")
+                token_counter = None
+    budget = TokenBudget(token_budget, token_counter, encoding) if token_budget > 0 and token_counter else None
+    totals = {'processed': 0, True: 0, False: 0, 'failed': 0, 'personal_distributed': 0, 'personal_unmatched': 0}
+    write_workers = int(config.get('write_workers', DEFAULT_WRITE_WORKERS))
+    for member in members:
+        if member['name']:
+            print(f"\n=== {member['name']} ({member['user_gid']}) ===")
+        result = render_for_user(member, discovered, anken_index, fetched, memo_merge, session.memo_files,
+                                 selected, project, manifest_encoding, token_counter, budget, write_workers)
+        for key, value in result.items():
+            totals[key] += value
+    METRICS.count('personal_distributed', totals['personal_distributed'])
+    METRICS.count('personal_unmatched', totals['personal_unmatched'])
+    METRICS.count('write_failed', totals['failed'])
+    project_cache.flush()
+
+    failed = f", {totals['failed']} failed" if totals['failed'] else ""
+    print(f"\nSync complete! ({totals['processed']} projects processed, "
+          f"{totals[True]} files written, {totals[False]} unchanged{failed})")
+
+
+def render_for_user(member, discovered, anken_index, fetched, memo_merge, memo_files, selected=None, project=None,
+                    manifest_encoding=None, token_counter=None, budget=None, write_workers=DEFAULT_WRITE_WORKERS):
+    """1 人分の案件別ファイル・個人ファイル・グローバルサマリーを出力する
+
+    Args:
+        member: team_members() の要素
+        fetched: fetch_all() の結果 (全メンバー共通)
+        selected: 指定案件の出力だけを更新する場合、その案件のリスト (--project)
+        manifest_encoding: 指定するとグローバルサマリーの隣に MANIFEST_NAME を出力する
+        token_counter: マニフェストのトークン数を数える get_tokens モジュール (None なら記録しない)
+        budget: 案件別ファイル・個人ファイルのトークン予算 (TokenBudget、None なら制限なし)
+        write_workers: 案件別ファイル・個人ファイルを並行して書き出すスレッド数
+
+    Returns:
+        dict: {'processed', True (書き込み数), False (変化なし数), 'failed' (書き出し失敗数),
+               'personal_distributed', 'personal_unmatched'}
+
+    """
+    user_gid = member['user_gid']
+    obsidian_vault_root = member['vault_root']
+    output_file = member['output_file']
+    partial = selected is not None
+
+    def for_user(tasks):
+        # チームモードの取得結果には他メンバーのタスクも含まれる
+        return [t for t in tasks if classify_task_role(t, user_gid) != '他']
+
+    # 役割判定・ソートキー・本文の生成はタスクごとに 1 回だけ行う
+    model = TaskViewModel(user_gid)
     all_project_data = []  # [(name, sections, personal_for_this_project)]
-    project_name_set = {p['name'] for p in discovered}  # 案件名マッチ用
 
     for proj in discovered:
+        if partial and proj not in selected:
+            # 振り分け先の添字を揃えるため空のまま残し、出力はしない
+            all_project_data.append({'project': proj, 'sections': [], 'personal_tasks': [], 'skip': True})
+            continue
         print(f"\n  --- {proj['name']} ---")
         sections = []
         for gid in proj['asana_config'].get('asana_project_gids', []):
-            asana_proj_name = fetch_project_name(projects_api, gid)
-            print(f"    Fetching: {asana_proj_name} ({gid})")
-            tasks = fetch_tasks_for_project(tasks_api, gid)
-            tasks = [t for t in tasks if classify_task_role(t, user_gid) in ('担当', 'コラボ')]
+            asana_proj_name, tasks = fetched[gid]
+            tasks = for_user(tasks)
+            print(f"    Project: {asana_proj_name} ({gid})")
             print(f"    -> {len(tasks)} tasks (担当/コラボのみ)")
-            for t in tasks:
-                if t.get('num_subtasks', 0) > 0:
-                    t['subtasks_data'] = fetch_subtasks(tasks_api, t['gid'])
-            sections.append((asana_proj_name, gid, tasks))
+            sections.append((asana_proj_name, gid, model.views(tasks)))
         all_project_data.append({
             'project': proj,
             'sections': sections,
             'personal_tasks': [],  # 後で個人プロジェクトから振り分け
         })
 
-    # --- 個人プロジェクトのタスク取得と振り分け ---
-    print("\n[3/5] Fetching personal project tasks...")
+    # --- 個人プロジェクトのタスク振り分け (取得は [2/5] で済んでいる) ---
+    print("\n[3/5] Routing personal project tasks...")
     unmatched_personal_tasks = []
 
-    for gid in personal_project_gids:
-        asana_proj_name = fetch_project_name(projects_api, gid)
-        print(f"  Fetching: {asana_proj_name} ({gid})")
-        tasks = fetch_tasks_for_project(tasks_api, gid)
-        tasks = [t for t in tasks if classify_task_role(t, user_gid) in ('担当', 'コラボ')]
+    for gid in member['personal_project_gids']:
+        asana_proj_name, tasks = fetched[gid]
+        tasks = for_user(tasks)
+        print(f"  Routing: {asana_proj_name} ({gid})")
         print(f"  -> {len(tasks)} tasks (担当/コラボのみ)")
 
-        for task in tasks:
-            if task.get('num_subtasks', 0) > 0:
-                task['subtasks_data'] = fetch_subtasks(tasks_api, task['gid'])
-
-            anken = get_custom_field_value(task, '案件')
-            matched = False
-            if anken:
-                for proj_data in all_project_data:
-                    proj_name = proj_data['project']['name']
-                    base_name = re.sub(r'\s*(?:\[Domain\]|\[Mini\])+$', '', proj_name, flags=re.IGNORECASE)
-                    aliases = proj_data['project'].get('anken_aliases', [])
-                    if anken == proj_name or anken == base_name or anken in aliases:
-                        proj_data['personal_tasks'].append(task)
-                        matched = True
-                        break
-            if not matched:
-                unmatched_personal_tasks.append(task)
-
-    distributed_count = sum(len(pd['personal_tasks']) for pd in all_project_data)
+        for view in model.views(tasks):
+            target = anken_index.get(normalize_anken(view.anken)) if view.anken else None
+            if target is not None:
+                all_project_data[target]['personal_tasks'].append(view)
+            else:
+                unmatched_personal_tasks.append(view)
+
+    distributed_count = sum(len(pd['personal_tasks']) for pd in all_project_data if not pd.get('skip'))
     print(f"  Distributed {distributed_count} to projects, {len(unmatched_personal_tasks)} unmatched")
+    METRICS.lap('route')
 
     # --- 案件別ファイル出力 ---
     print("\n[4/5] Writing per-project files...")
     summary_data = []
+    write_counts = {True: 0, False: 0}
+    targets = []  # [(proj_data, output_path)]
 
     for proj_data in all_project_data:
         proj = proj_data['project']
+        if proj_data.get('skip'):
+            continue
         if proj['name'] == '_INHOUSE':
             obsidian_path = os.path.join(obsidian_vault_root, '_INHOUSE')
         else:
@@ -576,32 +2102,328 @@ def sync_from_asana():
 
         has_tasks = bool(proj_data['sections'] or proj_data['personal_tasks'])
         has_config = bool(proj['asana_config'])
-        file_exists = os.path.exists(output_path)
 
         # タスクがなく、設定ファイルもなく、既存のMarkdownファイルもない場合は出力をスキップ
-        if not (has_tasks or has_config or file_exists):
+        if not (has_tasks or has_config or os.path.exists(output_path)):
             continue
-
-        write_project_file(
-            output_path=output_path,
-            project_name=proj['name'],
-            sections=proj_data['sections'],
-            personal_tasks=proj_data['personal_tasks'],
-            user_gid=user_gid,
-        )
-        summary_data.append((proj['name'], proj_data['sections'], proj_data['personal_tasks']))
-
-    # 個人/未分類ファイル
-    if unmatched_personal_tasks:
-        personal_output = os.path.join(obsidian_vault_root, 'asana-tasks-personal.md')
-        write_personal_file(personal_output, unmatched_personal_tasks, user_gid)
+        targets.append((proj_data, output_path))
+
+    personal_output = os.path.join(obsidian_vault_root, 'asana-tasks-personal.md')
+    # 既存メモは全出力ファイルで共有し、各ファイルは 1 回だけ読む
+    memos = MemoStore(memo_merge, memo_files)
+    memos.preload([path for _, path in targets]
+                  + ([personal_output] if unmatched_personal_tasks and not partial else []),
+                  output_file, write_workers)
+    manifest = None
+    if manifest_encoding is not None:
+        manifest = OutputManifest(os.path.join(os.path.dirname(output_file), MANIFEST_NAME),
+                                  manifest_encoding, token_counter)
+
+    # 案件別ファイルと個人/未分類ファイルは並行して書き出す。ログは案件の順に表示し、
+    # 1 案件の失敗で他の案件を止めない (サマリーには取得結果どおりに載せる)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, write_workers)) as pool:
+        futures = []
+        for proj_data, output_path in targets:
+            proj = proj_data['project']
+            futures.append((output_path, pool.submit(
+                run_logged, write_project_file,
+                output_path=output_path,
+                project_name=proj['name'],
+                sections=proj_data['sections'],
+                personal_tasks=proj_data['personal_tasks'],
+                memos=memos,
+                manifest=manifest,
+                budget=budget,
+            )))
+            summary_data.append((proj['name'], proj_data['sections'], proj_data['personal_tasks']))
+
+        # 個人/未分類ファイル (案件単位の同期では対象外)
+        if unmatched_personal_tasks and not partial:
+            futures.append((personal_output, pool.submit(
+                run_logged, write_personal_file, personal_output, unmatched_personal_tasks, memos, manifest, budget)))
+
+        for output_path, future in futures:
+            written, output, error = future.result()
+            print(output, end='')
+            if error is not None:
+                print(f"  WARNING: Failed to write {output_path}: {error}")
+                failed += 1
+            else:
+                write_counts[written] += 1
+    METRICS.lap('write_projects')
 
     # --- グローバルサマリー出力 ---
     print("\n[5/5] Writing global summary...")
-    write_global_summary(output_file, summary_data, unmatched_personal_tasks, user_gid)
+    if partial:
+        written = patch_global_summary(output_file, summary_data, memos, manifest)
+        if written is None:
+            print(f"  WARNING: {project} has no section in {output_file}; run a full sync to add it")
+        else:
+            write_counts[written] += 1
+    else:
+        written = write_global_summary(output_file, summary_data, unmatched_personal_tasks, memos, manifest)
+        write_counts[written] += 1
+    if manifest is not None:
+        manifest.save(keep_previous=partial)
+    METRICS.lap('write_summary')
+
+    return {
+        'processed': sum(1 for pd in all_project_data if not pd.get('skip')),
+        True: write_counts[True],
+        False: write_counts[False],
+        'failed': failed,
+        'personal_distributed': distributed_count,
+        'personal_unmatched': len(unmatched_personal_tasks),
+    }
+
+
+class _Tee(io.TextIOBase):
+    """書き込みを複数のストリームへ複製する (デーモンの同期ログを応答に含めるため)"""
+
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, text):
+        for stream in self.streams:
+            stream.write(text)
+        return len(text)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+
+class SyncDaemon:
+    """--daemon: SyncSession を保持したまま定期的に同期し、TCP (JSON Lines) でトリガーを受け付ける
+
+    コマンド (1 行 1 JSON):
+        {"cmd": "sync"}                    全体を同期する ("project": 案件名 で案件単位)
+                                           "schedule_minutes": N を付けると、依頼元 (Dashboard の
+                                           タイマーなど) が N 分ごとに同期を依頼してくるものとして、
+                                           その間は自前の定期同期を見送る (二重の同期を防ぐ)
+        {"cmd": "status"}                  実行中の同期・前回の結果・次回の予定を返す
+        {"cmd": "ping"} / {"cmd": "shutdown"}
+    sync の応答には同期中の出力 ("log") と sync_metrics.json と同じ計測値が含まれる。
+    同期は 1 つずつ実行し、実行中に受けたトリガーは前の同期の完了を待つ。
+    """
 
-    print(f"\nSync complete! ({len(all_project_data)} projects processed)")
+    def __init__(self, interval_minutes=DEFAULT_DAEMON_INTERVAL_MINUTES, incremental=None):
+        self.session = SyncSession()
+        self.interval = max(0.0, interval_minutes) * 60
+        self.incremental = incremental
+        self.sync_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.stop = threading.Event()
+        self.running = None
+        self.last = None
+        self.next_sync = time.time()  # 起動直後に 1 回同期する
+        self.client_schedule = None  # 依頼元が定期同期している場合の間隔 (分)
+
+    def run_sync(self, project=None, full=False, incremental=None):
+        """同期を 1 回実行し、結果を返す"""
+        with self.sync_lock:
+            with self.state_lock:
+                self.running = {'project': project, 'started_at': datetime.now().isoformat(timespec='seconds')}
+            log = io.StringIO()
+            result = {'project': project}
+            try:
+                with contextlib.redirect_stdout(_Tee(sys.__stdout__, log)):
+                    if incremental is None:
+                        incremental = self.incremental
+                    result['metrics'] = sync_from_asana(incremental=incremental, full=full,
+                                                        session=self.session, project=project)
+                result['status'] = 'ok'
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = f"{type(e).__name__}: {e}"
+                print(f"ERROR: {result['error']}", file=sys.stderr)
+            finished_at = datetime.now().isoformat(timespec='seconds')
+            with self.state_lock:
+                self.running = None
+                self.last = {'finished_at': finished_at, 'status': result['status'], 'project': project,
+                             'error': result.get('error')}
+                if project is None and self.interval:
+                    # defer_schedule で先送りした予定は前倒ししない
+                    self.next_sync = max(self.next_sync, time.time() + self.interval)
+            result['log'] = log.getvalue()
+            return result
+
+    def status(self):
+        with self.state_lock:
+            return {
+                'ok': True,
+                'pid': os.getpid(),
+                'running': self.running,
+                'last': self.last,
+                'interval_minutes': self.interval / 60,
+                'next_sync_in': (round(max(0.0, self.next_sync - time.time()), 1)
+                                 if self.next_sync != float('inf') else None),
+                'client_schedule_minutes': self.client_schedule,
+            }
+
+    def defer_schedule(self, minutes):
+        """依頼元が minutes 分ごとに同期を依頼してくる間は、自前の定期同期を見送る
+
+        依頼が途絶えたら (minutes + 猶予の後に) 自前の interval に戻る。
+        """
+        with self.state_lock:
+            self.client_schedule = minutes
+            self.next_sync = max(self.next_sync, time.time() + minutes * 60 + DAEMON_SCHEDULE_GRACE_SECONDS)
+
+    def handle(self, request):
+        cmd = request.get('cmd', 'sync')
+        if cmd == 'ping':
+            return {'ok': True}
+        if cmd == 'status':
+            return self.status()
+        if cmd == 'sync':
+            result = self.run_sync(request.get('project'), bool(request.get('full')), request.get('incremental'))
+            if request.get('schedule_minutes'):
+                self.defer_schedule(float(request['schedule_minutes']))
+            result['ok'] = result['status'] == 'ok'
+            return result
+        return {'ok': False, 'error': f"Unknown command: {cmd}"}
+
+    def schedule_loop(self):
+        """interval ごとに全体を同期する (interval が 0 なら起動時の 1 回だけ)"""
+        while not self.stop.is_set():
+            with self.state_lock:
+                wait = self.next_sync - time.time()
+            if wait > 0:
+                self.stop.wait(min(wait, 60))
+                continue
+            with self.state_lock:
+                self.next_sync = time.time() + self.interval if self.interval else float('inf')
+                self.client_schedule = None  # 依頼元の定期同期は途絶えている
+            self.run_sync()
+
+    def serve(self, port=0, state_path=DAEMON_STATE_PATH):
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    if not raw.strip():
+                        continue
+                    try:
+                        request = json.loads(raw.decode('utf-8'))
+                        if request.get('cmd') == 'shutdown':
+                            self.wfile.write(b'{"ok": true}\n')
+                            daemon.stop.set()
+                            threading.Thread(target=self.server.shutdown, daemon=True).start()
+                            return
+                        response = daemon.handle(request)
+                    except Exception as e:
+                        response = {'ok': False, 'error': str(e)}
+                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b"\n")
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler) as server:
+            server.daemon_threads = True
+            bound_port = server.server_address[1]
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump({'port': bound_port, 'pid': os.getpid()}, f)
+            print(f"Sync daemon listening on 127.0.0.1:{bound_port} "
+                  f"(interval: {self.interval / 60:g} min)", file=sys.stderr, flush=True)
+            scheduler = threading.Thread(target=self.schedule_loop, daemon=True)
+            scheduler.start()
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.stop.set()
+                try:
+                    os.remove(state_path)
+                except OSError:
+                    pass
+                with self.sync_lock:
+                    self.session.close()
+
+
+def query_daemon(request, state_path=DAEMON_STATE_PATH):
+    """起動中の --daemon に 1 リクエストを送る。応答がなければ None"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            port = int(json.load(f)['port'])
+        with socket.create_connection(('127.0.0.1', port), timeout=DAEMON_CONNECT_TIMEOUT) as sock:
+            sock.settimeout(None)
+            sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8'))
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
 
 if __name__ == '__main__':
-    sync_from_asana()
+    import argparse
+    parser = argparse.ArgumentParser(description="Sync Asana tasks into per-project Markdown files.")
+    parser.add_argument('--incremental', action='store_true', default=None,
+                        help="Fetch only tasks changed since the last sync (snapshot in asana_snapshot.db)")
+    parser.add_argument('--full', action='store_true',
+                        help="Refetch everything and rebuild the incremental snapshot")
+    parser.add_argument('--discover-only', action='store_true',
+                        help="Print discovered projects as JSON (uses .discovery_cache.json) and exit")
+    parser.add_argument('--profile', nargs='?', const=PROFILE_PATH, metavar='PATH',
+                        help=f"Run under cProfile and write stats to PATH (default: {os.path.basename(PROFILE_PATH)})")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Stay resident: sync every --interval minutes and accept triggers on 127.0.0.1")
+    parser.add_argument('--port', type=int, default=0, help="TCP port for --daemon (default: any free port)")
+    parser.add_argument('--interval', type=float,
+                        help="Minutes between scheduled syncs in --daemon mode "
+                             f"(default: config.json daemon_interval_minutes or {DEFAULT_DAEMON_INTERVAL_MINUTES}; 0 = triggers only)")
+    parser.add_argument('--project', metavar='NAME',
+                        help="Refetch only this project (案件) and patch its part of the global summary")
+    parser.add_argument('--status', action='store_true', help="Print the running daemon's status as JSON")
+    parser.add_argument('--stop', action='store_true', help="Stop the running daemon")
+    parser.add_argument('--no-daemon', action='store_true',
+                        help="Sync in this process even if a daemon is running")
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        response = query_daemon({'cmd': 'status' if args.status else 'shutdown'})
+        if response is None:
+            print("No sync daemon is running.", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    if not (args.daemon or args.discover_only or args.profile or args.no_daemon):
+        # デーモンが起動していれば同期を依頼し、その出力を表示する
+        response = None
+        if os.path.exists(DAEMON_STATE_PATH):
+            response = query_daemon({'cmd': 'sync', 'project': args.project, 'full': args.full,
+                                     'incremental': args.incremental})
+        if response is not None:
+            print(response.get('log', ''), end='')
+            if not response.get('ok'):
+                print(f"ERROR: {response.get('error')}", file=sys.stderr)
+                sys.exit(1)
+            sys.exit(0)
+
+    if args.daemon:
+        interval = args.interval
+        if interval is None:
+            interval = float(load_config().get('daemon_interval_minutes', DEFAULT_DAEMON_INTERVAL_MINUTES))
+        SyncDaemon(interval, incremental=args.incremental).serve(args.port)
+    elif args.discover_only:
+        # 検出ログは stderr へ回し、stdout は JSON だけにする
+        with contextlib.redirect_stdout(sys.stderr):
+            discovered = discover_projects(load_paths()['boxProjectsRoot'])
+        print(json.dumps(discovered, ensure_ascii=False, indent=2))
+    elif args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(sync_from_asana, incremental=args.incremental, full=args.full, project=args.project)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"\nProfile written to {args.profile}")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    else:
+        sync_from_asana(incremental=args.incremental, full=args.full, project=args.project)
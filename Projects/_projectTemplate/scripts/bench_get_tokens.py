@@ -0,0 +1,117 @@
+"""Benchmark get_tokens.py: cold one-shot invocations vs. a warm --serve instance.
+
+Usage:
+    python bench_get_tokens.py [--runs 20] [--files a.md b.md ...] [--model o200k_base]
+
+Reports per-request latency (ms) for:
+  cold    - `python get_tokens.py --no-server --no-cache ...` (interpreter + tiktoken startup every time)
+  client  - `python get_tokens.py ...` talking to a running `--serve --port 0` (thin client)
+  warm    - requests written to a `--serve` process over stdin/stdout (no process spawn at all)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOKEN_SCRIPT = os.path.join(SCRIPT_DIR, "get_tokens.py")
+SERVER_STATE_PATH = os.path.join(SCRIPT_DIR, ".token_server.json")
+
+SAMPLE_TEXT = "# Current Focus\n\n- Review the decision log and update the summary.\n" * 20
+
+
+def summarize(label, samples):
+    samples_ms = [s * 1000 for s in samples]
+    print(f"{label:<8} n={len(samples_ms):<4} "
+          f"mean={statistics.mean(samples_ms):8.1f} ms  "
+          f"median={statistics.median(samples_ms):8.1f} ms  "
+          f"min={min(samples_ms):8.1f} ms")
+
+
+def bench_cold(cmd_args, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, TOKEN_SCRIPT, "--no-server", "--no-cache"] + cmd_args,
+                       check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_client(cmd_args, runs, model):
+    server = subprocess.Popen([sys.executable, TOKEN_SCRIPT, "--serve", "--port", "0", "--no-cache", "--model", model],
+                              stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while not os.path.exists(SERVER_STATE_PATH):
+            if time.time() > deadline or server.poll() is not None:
+                raise RuntimeError("token server did not start")
+            time.sleep(0.05)
+        # Warm the encoding once so the first measured request is not a load
+        subprocess.run([sys.executable, TOKEN_SCRIPT, "--text", "warm-up"], check=True, stdout=subprocess.DEVNULL)
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, TOKEN_SCRIPT, "--no-cache"] + cmd_args, check=True, stdout=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+        return samples
+    finally:
+        server.terminate()
+        server.wait()
+        if os.path.exists(SERVER_STATE_PATH):
+            os.remove(SERVER_STATE_PATH)
+
+
+def bench_warm(request, runs, model):
+    server = subprocess.Popen([sys.executable, TOKEN_SCRIPT, "--serve", "--no-cache", "--model", model],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    try:
+        server.stdin.write(json.dumps({"text": "warm-up"}) + "\n")
+        server.stdin.flush()
+        server.stdout.readline()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            server.stdin.write(json.dumps(request) + "\n")
+            server.stdin.flush()
+            server.stdout.readline()
+            samples.append(time.perf_counter() - start)
+        return samples
+    finally:
+        server.stdin.close()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Requests per scenario.")
+    parser.add_argument("--files", nargs="+", help="Files to count (default: a generated sample file).")
+    parser.add_argument("--model", default="o200k_base")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.files
+        if not files:
+            sample = os.path.join(tmp, "current_focus.md")
+            with open(sample, "w", encoding="utf-8") as f:
+                f.write(SAMPLE_TEXT)
+            files = [sample]
+        files = [os.path.abspath(p) for p in files]
+        cmd_args = ["--model", args.model, "--files"] + files
+
+        if os.path.exists(SERVER_STATE_PATH):
+            print("A token server is already running; stop it before benchmarking.", file=sys.stderr)
+            sys.exit(1)
+
+        print(f"{len(files)} file(s), {args.runs} runs each, model={args.model}")
+        summarize("cold", bench_cold(cmd_args, args.runs))
+        summarize("client", bench_client(cmd_args, args.runs, args.model))
+        summarize("warm", bench_warm({"files": files, "model": args.model}, args.runs, args.model))
+
+
+if __name__ == "__main__":
+    main()
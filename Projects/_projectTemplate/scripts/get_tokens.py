@@ -1,10 +1,136 @@
 import sys
-import tiktoken
+import os
+import atexit
+import fnmatch
+import hashlib
+import pickle
+import re
+import socket
+import threading
+import time
 import argparse
 
+_START = time.perf_counter()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(SCRIPT_DIR, ".token_cache.json")
+CACHE_VERSION = 2
+SERVER_STATE_PATH = os.path.join(SCRIPT_DIR, ".token_server.json")
+SERVER_CONNECT_TIMEOUT = 0.2
+# Encodings pre-parsed by --prepare: loading one skips tiktoken's BPE download and parsing
+ENCODING_DIR = os.path.join(SCRIPT_DIR, ".tiktoken_encodings")
+ENCODING_FORMAT = 1
+# Upper bound on socket waits while tiktoken downloads an encoding that is not prepared
+DOWNLOAD_TIMEOUT = 10.0
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+# Files at least this large are counted in streaming mode (see count_tokens_stream)
+STREAM_THRESHOLD = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+STREAM_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# A line break that no tiktoken pre-tokenizer piece can span: printable non-space
+# before it, and after it a printable character that is neither space nor '/'.
+_SAFE_BREAK = re.compile(rb"[!-~]\r?\n(?=[!-.0-~])")
+_SAFE_NEXT = re.compile(rb"[!-.0-~]")
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+# Failed loads per model, re-raised without another download attempt (until --prepare writes the file)
+_encoding_errors = {}
+# Set by --offline: never fall back to tiktoken.get_encoding() (which may download)
+_offline = False
+# Seconds spent per startup phase, reported by --timings
+_timings = {}
+
+def prepared_path(model: str, encoding_dir: str = ENCODING_DIR) -> str:
+    return os.path.join(encoding_dir, f"{model}.pickle")
+
+def load_prepared(model: str, encoding_dir: str = ENCODING_DIR):
+    """Build an Encoding from the file written by --prepare. Returns None if there is none."""
+    path = prepared_path(model, encoding_dir)
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Warning: ignoring prepared encoding {path}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(data, dict) or data.get("format") != ENCODING_FORMAT:
+        return None
+    import tiktoken
+    return tiktoken.Encoding(data["name"], pat_str=data["pat_str"], mergeable_ranks=data["mergeable_ranks"],
+                             special_tokens=data["special_tokens"])
+
+def fetch_encoding(model: str):
+    """tiktoken.get_encoding() with socket waits bounded by DOWNLOAD_TIMEOUT instead of stalling offline."""
+    import tiktoken
+    previous = socket.getdefaulttimeout()
+    socket.setdefaulttimeout(DOWNLOAD_TIMEOUT)
+    try:
+        return tiktoken.get_encoding(model)
+    finally:
+        socket.setdefaulttimeout(previous)
+
+def get_encoding(model: str = "o200k_base"):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        with _encodings_lock:
+            encoding = _encodings.get(model)
+            if encoding is None:
+                error = _encoding_errors.get(model)
+                if error is not None and not os.path.exists(prepared_path(model)):
+                    raise error
+                try:
+                    encoding = _load_encoding(model)
+                except Exception as e:
+                    _encoding_errors[model] = e
+                    raise
+                _encoding_errors.pop(model, None)
+                _encodings[model] = encoding
+    return encoding
+
+def _load_encoding(model: str):
+    # Imported lazily so that thin-client invocations never pay for tiktoken
+    start = time.perf_counter()
+    import tiktoken
+    _timings.setdefault("import", time.perf_counter() - start)
+    start = time.perf_counter()
+    encoding, source = load_prepared(model), "prepared"
+    if encoding is None:
+        if _offline:
+            raise RuntimeError(f"encoding {model} is not prepared in {ENCODING_DIR} "
+                               f"(run get_tokens.py --prepare {model} once with network access)")
+        encoding, source = fetch_encoding(model), "tiktoken"
+    _timings[f"load {model} ({source})"] = time.perf_counter() - start
+    return encoding
+
+def prepare_encodings(models, encoding_dir: str = ENCODING_DIR) -> list:
+    """Fetch encodings through tiktoken once and store them pre-parsed for load_prepared(). Returns the paths."""
+    os.makedirs(encoding_dir, exist_ok=True)
+    paths = []
+    for model in models:
+        encoding = fetch_encoding(model)
+        # The constructor arguments, as in tiktoken's "extending tiktoken" recipe
+        data = {"format": ENCODING_FORMAT, "name": encoding.name, "pat_str": encoding._pat_str,
+                "mergeable_ranks": encoding._mergeable_ranks, "special_tokens": encoding._special_tokens}
+        path = prepared_path(model, encoding_dir)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+def print_timings():
+    phases = [f"{name} {seconds * 1000:.1f} ms" for name, seconds in _timings.items()]
+    phases.append(f"total {(time.perf_counter() - _START) * 1000:.1f} ms")
+    print("Timings: " + ", ".join(phases), file=sys.stderr)
+
 def count_tokens(text: str, model: str = "o200k_base") -> int:
     try:
-        encoding = tiktoken.get_encoding(model)
+        encoding = get_encoding(model)
         return len(encoding.encode(text))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -12,34 +138,669 @@ def count_tokens(text: str, model: str = "o200k_base") -> int:
 
 import json
 
+def decode_text(data: bytes) -> str:
+    # Same result as open(path, "r", encoding="utf-8").read() (universal newlines)
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+class TokenCache:
+    """Persistent token counts keyed by (absolute path, encoding).
+
+    An entry is reused as-is while the file's (mtime_ns, size) are unchanged.
+    If only the metadata changed (touch, Box re-download), the content hash is
+    compared before re-encoding. Entries for deleted files are evicted on save.
+
+    Each entry also keeps an append checkpoint [offset, prefix_sha256, prefix_tokens]:
+    the token count of the file up to a safe line break. If a changed file still
+    starts with that exact prefix, only the bytes after it are encoded.
+
+    path=None keeps the cache in memory only (e.g. --no-cache with --manifest).
+    """
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path is None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.entries = data.get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    @staticmethod
+    def key(path: str, model: str) -> str:
+        return f"{model}|{os.path.normcase(os.path.abspath(path))}"
+
+    def lookup(self, key: str, st: os.stat_result):
+        entry = self.entries.get(key)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry["tokens"]
+        return None
+
+    def store(self, key: str, st: os.stat_result, digest: str, tokens: int, checkpoint: list = None):
+        self.entries[key] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha256": digest,
+            "tokens": tokens,
+            "checkpoint": checkpoint,
+        }
+        self.dirty = True
+
+    def add_manifest(self, manifest_path: str, model: str) -> int:
+        """Seed entries from a sync_from_asana.py asana-tasks-manifest.json. Returns the number used.
+
+        Manifest entries carry the same (mtime_ns, size, sha256, tokens) as cache entries, so they
+        are trusted exactly like the cache: as-is while the file's metadata matches, and after a
+        hash comparison (no re-encode) when only the metadata changed.
+        """
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                files = json.load(f).get("files", [])
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: could not read manifest {manifest_path}: {e}", file=sys.stderr)
+            return 0
+        root = os.path.dirname(os.path.abspath(manifest_path))
+        used = 0
+        for item in files:
+            if item.get("encoding") != model or item.get("tokens") is None:
+                continue
+            key = self.key(os.path.join(root, item["path"]), model)
+            entry = self.entries.get(key)
+            if entry and entry["sha256"] == item["sha256"] and entry["mtime_ns"] == item["mtime_ns"]:
+                used += 1
+                continue
+            self.entries[key] = {
+                "mtime_ns": item["mtime_ns"],
+                "size": item["size"],
+                "sha256": item["sha256"],
+                "tokens": item["tokens"],
+                "checkpoint": None,
+            }
+            self.dirty = True
+            used += 1
+        return used
+
+    def evict_missing(self):
+        for key in list(self.entries):
+            path = key.split("|", 1)[1]
+            if not os.path.isfile(path):
+                del self.entries[key]
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty or self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Warning: could not write token cache: {e}", file=sys.stderr)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def _stream_cut(buf: bytes, force: bool) -> int:
+    """Offset after the last safe line break in buf; 0 if none (and not forced)."""
+    hi = len(buf)
+    while hi > 0:
+        lo = max(0, hi - 65536)
+        last = None
+        for last in _SAFE_BREAK.finditer(buf, lo, hi):
+            pass
+        if last is not None:
+            return last.end()
+        if lo == 0:
+            break
+        hi = lo + 4 # overlap so a break straddling the window edge is still seen
+    if not force:
+        return 0
+    # No safe break within STREAM_MAX_CHUNK_SIZE: cut at a newline/space, else at a UTF-8 boundary
+    cut = max(buf.rfind(b"\n"), buf.rfind(b" "), buf.rfind(b"\t"))
+    if cut >= 0:
+        return cut + 1
+    cut = len(buf) - 1
+    while cut > 0 and (buf[cut] & 0xC0) == 0x80:
+        cut -= 1
+    return cut or len(buf)
+
+def _stream_count(f, encoding, hasher, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Encode an open binary file from its current position, chunk by chunk.
+
+    hasher must already cover the bytes before the current position; it is fed every
+    chunk. Returns (tokens, checkpoint_length, checkpoint_tokens, checkpoint_sha256),
+    where the checkpoint is the last chunk boundary (relative to the start position).
+    tokens is -1 if the encoder rejects the text.
+    """
+    total = 0
+    consumed = 0
+    checkpoint = (0, 0, None)
+    buf = b""
+    while True:
+        data = f.read(chunk_size)
+        buf += data
+        if data:
+            cut = _stream_cut(buf, len(buf) >= STREAM_MAX_CHUNK_SIZE)
+            if not cut:
+                continue
+        elif buf:
+            cut = _stream_cut(buf, False) or len(buf)
+        else:
+            return (total,) + checkpoint
+        chunk, buf = buf[:cut], buf[cut:]
+        try:
+            total += len(encoding.encode(decode_text(chunk)))
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return -1, 0, 0, None
+        hasher.update(chunk)
+        consumed += cut
+        if data or buf:
+            # Not the end of the file, so an append cannot merge across this boundary
+            checkpoint = (consumed, total, hasher.copy().hexdigest())
+
+def count_tokens_stream(path: str, model: str = "o200k_base", chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    """Count tokens in a file chunk by chunk, never holding the whole text or its token list.
+
+    Chunks are cut right after a safe line break (see _SAFE_BREAK). No pre-tokenizer
+    piece of the tiktoken encodings crosses such a break, so the sum of the chunk
+    counts equals count_tokens() on the whole file. Only when STREAM_MAX_CHUNK_SIZE
+    bytes contain no safe break is a chunk cut at a plain newline/space instead; each
+    such forced cut can change the total by a few tokens (at most the tokens of the
+    one piece it splits, in practice +-1). Pass exact mode (--exact) to avoid streaming.
+    Memory use is bounded by STREAM_MAX_CHUNK_SIZE regardless of file size.
+    """
+    try:
+        encoding = get_encoding(model)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return -1
+    with open(path, "rb") as f:
+        return _stream_count(f, encoding, hashlib.sha256(), chunk_size)[0]
+
+def _hash_file(f, split: int = None):
+    """sha256 of an open binary file, plus a hasher snapshot taken after `split` bytes."""
+    hasher = hashlib.sha256()
+    snapshot = None
+    position = 0
+    for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+        if split is not None and snapshot is None and position + len(block) >= split:
+            hasher.update(block[:split - position])
+            snapshot = hasher.copy()
+            hasher.update(block[split - position:])
+        else:
+            hasher.update(block)
+        position += len(block)
+    if split == 0:
+        snapshot = hashlib.sha256()
+    return hasher.hexdigest(), snapshot
+
+def _read_for_count(path: str, model: str, cache: TokenCache = None, stream_threshold: int = STREAM_THRESHOLD):
+    """Stat/read one file for counting. Returns (tokens, job).
+
+    tokens is set when the count is already known (cache hit or streamed); job then
+    holds what the cache needs ({"st", "digest", "checkpoint"}), or is None on a
+    metadata hit. Otherwise tokens is None and the caller encodes job["head"] and
+    job["tail"] and finishes with _complete(). When the cached append checkpoint
+    still matches the start of the file, head/tail only cover the bytes after it.
+    Files of at least stream_threshold bytes are streamed here; None = exact mode.
+    """
+    st = os.stat(path)
+    key = TokenCache.key(path, model)
+    entry = None
+    if cache is not None:
+        tokens = cache.lookup(key, st)
+        if tokens is not None:
+            return tokens, None
+        entry = cache.entries.get(key)
+    checkpoint = entry.get("checkpoint") if entry else None
+    if checkpoint and checkpoint[0] > st.st_size:
+        checkpoint = None
+
+    if stream_threshold is not None and st.st_size >= stream_threshold:
+        with open(path, "rb") as f:
+            digest, prefix_hasher = _hash_file(f, checkpoint[0] if checkpoint else None)
+            if entry and entry["sha256"] == digest:
+                return entry["tokens"], {"st": st, "digest": digest, "checkpoint": checkpoint}
+            f.seek(checkpoint[0] if checkpoint else 0)
+            if (checkpoint and prefix_hasher is not None and prefix_hasher.hexdigest() == checkpoint[1]
+                    and _SAFE_NEXT.match(f.read(1))):
+                start, base_tokens = checkpoint[0], checkpoint[2]
+            else:
+                start, base_tokens, prefix_hasher = 0, 0, hashlib.sha256()
+            try:
+                encoding = get_encoding(model)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return -1, None
+            f.seek(start)
+            tokens, cp_length, cp_tokens, cp_digest = _stream_count(f, encoding, prefix_hasher)
+        if tokens < 0:
+            return -1, None
+        new_checkpoint = [start + cp_length, cp_digest, base_tokens + cp_tokens] if cp_digest else checkpoint
+        return base_tokens + tokens, {"st": st, "digest": digest, "checkpoint": new_checkpoint}
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry["sha256"] == digest:
+        return entry["tokens"], {"st": st, "digest": digest, "checkpoint": checkpoint}
+    start, base_tokens = 0, 0
+    if (checkpoint and _SAFE_NEXT.match(data, checkpoint[0])
+            and hashlib.sha256(data[:checkpoint[0]]).hexdigest() == checkpoint[1]):
+        start, base_tokens = checkpoint[0], checkpoint[2]
+    rest = data[start:]
+    cut = _stream_cut(rest, False)
+    return None, {
+        "st": st,
+        "digest": digest,
+        "base_tokens": base_tokens,
+        "head": decode_text(rest[:cut]),
+        "tail": decode_text(rest[cut:]),
+        "checkpoint_offset": start + cut,
+        "checkpoint_sha256": hashlib.sha256(data[:start + cut]).hexdigest() if cut else (checkpoint[1] if start else None),
+    }
+
+def _complete(path: str, model: str, cache: TokenCache, job: dict, head_tokens: int, tail_tokens: int) -> int:
+    """Combine the encoded head/tail of a job into the file's count and cache it."""
+    if head_tokens < 0 or tail_tokens < 0:
+        return -1
+    tokens = job["base_tokens"] + head_tokens + tail_tokens
+    if cache is not None:
+        checkpoint = None
+        if job["checkpoint_sha256"]:
+            checkpoint = [job["checkpoint_offset"], job["checkpoint_sha256"], job["base_tokens"] + head_tokens]
+        cache.store(TokenCache.key(path, model), job["st"], job["digest"], tokens, checkpoint)
+    return tokens
+
+def count_file(path: str, model: str = "o200k_base", cache: TokenCache = None, stream_threshold: int = STREAM_THRESHOLD) -> int:
+    """Count tokens in a file, consulting the cache first. Raises OSError/UnicodeDecodeError."""
+    tokens, job = _read_for_count(path, model, cache, stream_threshold)
+    if tokens is None:
+        head_tokens = count_tokens(job["head"], model)
+        tail_tokens = count_tokens(job["tail"], model) if head_tokens >= 0 else -1
+        return _complete(path, model, cache, job, head_tokens, tail_tokens)
+    if job is not None and cache is not None and tokens >= 0:
+        cache.store(TokenCache.key(path, model), job["st"], job["digest"], tokens, job["checkpoint"])
+    return tokens
+
+def count_files(paths: list, model: str = "o200k_base", cache: TokenCache = None, workers: int = DEFAULT_WORKERS,
+                stream_threshold: int = STREAM_THRESHOLD) -> dict:
+    """Count many files: concurrent reads, one batched encode. Unreadable files are omitted.
+
+    The result preserves the order of `paths`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = max(1, workers)
+    unique_paths = list(dict.fromkeys(paths))
+
+    def read(path):
+        try:
+            return _read_for_count(path, model, cache, stream_threshold)
+        except Exception:
+            return None # Skip unreadable or missing files
+
+    if workers == 1 or len(unique_paths) <= 1:
+        reads = [read(p) for p in unique_paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            reads = list(pool.map(read, unique_paths))
+
+    counts = {}
+    pending = []
+    for path, item in zip(unique_paths, reads):
+        if item is None:
+            continue
+        tokens, job = item
+        if tokens is not None:
+            counts[path] = tokens
+            if job is not None and cache is not None and tokens >= 0:
+                cache.store(TokenCache.key(path, model), job["st"], job["digest"], tokens, job["checkpoint"])
+        else:
+            pending.append((path, job))
+
+    if pending:
+        texts = [text for _, job in pending for text in (job["head"], job["tail"])]
+        try:
+            encoding = get_encoding(model)
+        except Exception as e:
+            # The encoding itself is unavailable: every file reports -1, without retrying per file
+            print(f"Error: {e}", file=sys.stderr)
+            token_counts = [-1] * len(texts)
+        else:
+            try:
+                token_counts = [len(t) for t in encoding.encode_batch(texts, num_threads=workers)]
+            except Exception:
+                # e.g. a file containing a special token: count individually so only that file reports -1
+                token_counts = [count_tokens(t, model) for t in texts]
+        for i, (path, job) in enumerate(pending):
+            counts[path] = _complete(path, model, cache, job, token_counts[2 * i], token_counts[2 * i + 1])
+
+    return {p: counts[p] for p in unique_paths if p in counts}
+
+def _matches(rel_path: str, name: str, patterns) -> bool:
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+def walk_files(root: str, include=("*.md",), exclude=(), max_size: int = None):
+    """List files under root with os.scandir, in sorted order.
+
+    Symlinked and junctioned directories are followed, but each real directory
+    (identified by device/inode) is entered only once, so link cycles terminate.
+    Patterns match either the path relative to root ('/' separated) or the bare
+    name; exclude also prunes directories. Returns (files, skipped_over_max_size).
+    """
+    files = []
+    skipped = []
+    seen_dirs = set()
+
+    def visit(dir_path):
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            return # Broken link/junction
+        ident = (st.st_dev, st.st_ino) if st.st_ino else os.path.normcase(os.path.realpath(dir_path))
+        if ident in seen_dirs:
+            return
+        seen_dirs.add(ident)
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+            if exclude and _matches(rel_path, entry.name, exclude):
+                continue
+            try:
+                if entry.is_dir():
+                    visit(entry.path)
+                    continue
+                if not entry.is_file() or (include and not _matches(rel_path, entry.name, include)):
+                    continue
+                if max_size is not None and entry.stat().st_size > max_size:
+                    skipped.append(entry.path)
+                    continue
+            except OSError:
+                continue
+            files.append(entry.path)
+
+    visit(root)
+    return files, skipped
+
+def count_tree(roots: list, include=("*.md",), exclude=(), max_size: int = None, model: str = "o200k_base",
+               cache: TokenCache = None, workers: int = DEFAULT_WORKERS, stream_threshold: int = STREAM_THRESHOLD) -> dict:
+    """Count every matching file under roots and roll the counts up per directory.
+
+    Returns {"files": {path: tokens}, "dirs": {dir: total}, "total": n, "skipped": [paths over max_size]}.
+    Each directory total covers all counted files below it, down from its root.
+    """
+    file_roots, skipped, tops = {}, [], []
+    for root in roots:
+        root = os.path.abspath(root)
+        root_files, root_skipped = walk_files(root, include, exclude, max_size)
+        for path in root_files:
+            file_roots.setdefault(path, root)
+        skipped.extend(root_skipped)
+        tops.append(root)
+
+    counts = count_files(list(file_roots), model, cache, workers, stream_threshold)
+    dirs = {top: 0 for top in tops}
+    for path, tokens in counts.items():
+        if tokens < 0:
+            continue
+        top = file_roots[path]
+        d = os.path.dirname(path)
+        while True:
+            dirs[d] = dirs.get(d, 0) + tokens
+            if d == top or len(d) <= len(top):
+                break
+            d = os.path.dirname(d)
+    return {
+        "files": counts,
+        "dirs": dict(sorted(dirs.items())),
+        "total": sum(t for t in counts.values() if t >= 0),
+        "skipped": skipped,
+    }
+
+def open_cache(cache_file: str = CACHE_PATH, manifests=(), model: str = "o200k_base", cache: TokenCache = None):
+    """The token cache to count with: `cache` or cache_file (None = no persistent cache), seeded from manifests."""
+    if cache is None and cache_file is not None:
+        cache = TokenCache(cache_file)
+    if manifests:
+        if cache is None:
+            cache = TokenCache(None)
+        for manifest in manifests:
+            cache.add_manifest(manifest, model)
+    return cache
+
+def handle_request(request: dict, cache: TokenCache = None, model: str = "o200k_base", workers: int = DEFAULT_WORKERS) -> dict:
+    """Answer one request: {"files": [...]}, {"dirs": [...]}, {"file": path} or {"text": str}, each with an optional "model".
+
+    "manifests": [path, ...] seeds the cache from sync_from_asana.py output manifests first.
+    """
+    model = request.get("model") or model
+    if not request.get("cache", True):
+        cache = None
+    cache = open_cache(None, request.get("manifests") or (), model, cache)
+    stream_threshold = None if request.get("exact") else request.get("stream_threshold", STREAM_THRESHOLD)
+    if request.get("cmd") == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if "files" in request:
+        return {"results": count_files(request["files"], model, cache, request.get("workers", workers), stream_threshold)}
+    if "dirs" in request:
+        return {"tree": count_tree(request["dirs"], request.get("include") or ("*.md",), request.get("exclude") or (),
+                                   request.get("max_size"), model, cache, request.get("workers", workers), stream_threshold)}
+    if "file" in request:
+        return {"tokens": count_file(request["file"], model, cache, stream_threshold)}
+    if "text" in request:
+        return {"tokens": count_tokens(request["text"], model)}
+    raise ValueError("request must contain 'files', 'dirs', 'file' or 'text'")
+
+class TokenServer:
+    """Keeps encodings and the token cache warm between requests (newline-delimited JSON)."""
+
+    def __init__(self, cache: TokenCache = None, model: str = "o200k_base", workers: int = DEFAULT_WORKERS):
+        self.cache = cache
+        self.model = model
+        self.workers = workers
+        self.lock = threading.Lock()
+
+    def handle_line(self, line: str) -> str:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return json.dumps({"error": str(e)})
+        return self.respond(request)
+
+    def respond(self, request) -> str:
+        """Answer one parsed request; any error becomes an {"error": ...} reply."""
+        try:
+            with self.lock:
+                response = handle_request(request, self.cache, self.model, self.workers)
+                if self.cache is not None:
+                    self.cache.save()
+        except Exception as e:
+            response = {"error": str(e)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return json.dumps(response)
+
+    def serve_stdio(self):
+        for line in sys.stdin:
+            if line.strip():
+                print(self.handle_line(line), flush=True)
+
+    def serve_tcp(self, port: int = 0, state_path: str = SERVER_STATE_PATH):
+        import socketserver
+
+        token_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    if not raw.strip():
+                        continue
+                    try:
+                        request = json.loads(raw)
+                    except ValueError as e:  # also covers invalid UTF-8
+                        reply = json.dumps({"error": str(e)})
+                    else:
+                        if isinstance(request, dict) and request.get("cmd") == "shutdown":
+                            self.wfile.write(b'{"ok": true}\n')
+                            threading.Thread(target=self.server.shutdown, daemon=True).start()
+                            return
+                        reply = token_server.respond(request)
+                    self.wfile.write(reply.encode("utf-8") + b"\n")
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        with socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler) as server:
+            server.daemon_threads = True
+            bound_port = server.server_address[1]
+            with open(state_path, "w", encoding="utf-8") as f:
+                json.dump({"port": bound_port, "pid": os.getpid()}, f)
+            print(f"Token server listening on 127.0.0.1:{bound_port}", file=sys.stderr, flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                try:
+                    os.remove(state_path)
+                except OSError:
+                    pass
+
+def query_server(request: dict, state_path: str = SERVER_STATE_PATH):
+    """Send one request to a running --serve --port instance. Returns None if no server answers."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            port = int(json.load(f)["port"])
+        with socket.create_connection(("127.0.0.1", port), timeout=SERVER_CONNECT_TIMEOUT) as sock:
+            sock.settimeout(None)
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as f:
+                line = f.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Count OpenAI tokens in a file or string.")
     parser.add_argument("--file", "-f", help="Path to a single file to count tokens for.")
     parser.add_argument("--files", nargs="+", help="List of file paths to count tokens for. Outputs JSON.")
+    parser.add_argument("--dir", "-d", action="append", help="Directory to walk recursively (repeatable). Outputs JSON with per-file and per-directory totals.")
+    parser.add_argument("--glob", "-g", action="append", help="Include pattern for --dir, e.g. '*.md' or 'context/*' (repeatable, default: *.md).")
+    parser.add_argument("--exclude", "-x", action="append", default=[], help="Exclude pattern for files and directories under --dir (repeatable).")
+    parser.add_argument("--max-size", type=int, help="With --dir: skip files larger than this many bytes.")
     parser.add_argument("--text", "-t", help="Raw text string to count tokens for.")
     parser.add_argument("--model", "-m", default="o200k_base", help="Encoding model (e.g. o200k_base, cl100k_base)")
-    
+    parser.add_argument("--cache-file", default=CACHE_PATH, help="Path of the persistent token-count cache.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the token-count cache.")
+    parser.add_argument("--workers", "-j", type=int, default=DEFAULT_WORKERS, help="Threads used to read and encode --files (default: CPU count).")
+    parser.add_argument("--exact", action="store_true", help="Encode every file in one piece (no streaming for large files).")
+    parser.add_argument("--stream-threshold", type=int, default=STREAM_THRESHOLD,
+                        help=f"Stream files of at least this many bytes in bounded memory (default: {STREAM_THRESHOLD}).")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived server answering newline-delimited JSON requests.")
+    parser.add_argument("--port", type=int, help="With --serve: listen on 127.0.0.1:PORT (0 = any free port) instead of stdin/stdout.")
+    parser.add_argument("--no-server", action="store_true", help="Always count in this process, even if a server is running.")
+    parser.add_argument("--manifest", action="append", default=[],
+                        help="asana-tasks-manifest.json from sync_from_asana.py (repeatable): reuse its token counts while the file hashes match.")
+    parser.add_argument("--prepare", nargs="*", metavar="ENCODING",
+                        help=f"Download the given encodings (default: --model) once and store them pre-parsed in {ENCODING_DIR} for fast, offline loading.")
+    parser.add_argument("--offline", action="store_true", help="Only load prepared encodings; fail instead of downloading.")
+    parser.add_argument("--timings", action="store_true", help="Print startup and encoding load times to stderr on exit.")
+
     args = parser.parse_args()
+    _offline = args.offline
+    if args.timings:
+        _timings["startup"] = time.perf_counter() - _START
+        atexit.register(print_timings)
 
-    if args.files:
-        results = {}
-        for path in args.files:
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    results[path] = count_tokens(content, args.model)
-            except Exception as e:
-                pass # Skip unreadable or missing files
+    if args.prepare is not None:
+        try:
+            for path in prepare_encodings(args.prepare or [args.model]):
+                print(path)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    if args.serve:
+        server = TokenServer(None if args.no_cache else TokenCache(args.cache_file), args.model, args.workers)
+        if args.port is None:
+            server.serve_stdio()
+        else:
+            server.serve_tcp(args.port)
+        if server.cache is not None:
+            server.cache.evict_missing()
+            server.cache.save()
+        sys.exit(0)
+
+    stream_threshold = None if args.exact else args.stream_threshold
+    use_server = not args.no_server and os.path.exists(SERVER_STATE_PATH)
+    manifests = [os.path.abspath(m) for m in args.manifest]
+    cache_file = None if args.no_cache else args.cache_file
+
+    if args.dir or args.glob:
+        roots = [os.path.abspath(d) for d in (args.dir or ["."])]
+        include = args.glob or ["*.md"]
+        response = None
+        if use_server:
+            response = query_server({"dirs": roots, "include": include, "exclude": args.exclude, "max_size": args.max_size,
+                                     "model": args.model, "cache": not args.no_cache, "workers": args.workers,
+                                     "exact": args.exact, "stream_threshold": args.stream_threshold, "manifests": manifests})
+        if response is not None and "tree" in response:
+            tree = response["tree"]
+        else:
+            cache = open_cache(cache_file, manifests, args.model)
+            tree = count_tree(roots, include, args.exclude, args.max_size, args.model, cache, args.workers, stream_threshold)
+            if cache is not None:
+                cache.evict_missing()
+                cache.save()
+        print(json.dumps(tree, ensure_ascii=False))
+    elif args.files:
+        response = None
+        if use_server:
+            abs_paths = [os.path.abspath(p) for p in args.files]
+            response = query_server({"files": abs_paths, "model": args.model, "cache": not args.no_cache, "workers": args.workers,
+                                     "exact": args.exact, "stream_threshold": args.stream_threshold, "manifests": manifests})
+        if response is not None and "results" in response:
+            # Map absolute paths back to the spelling the caller used
+            results = {p: response["results"][a] for p, a in zip(args.files, abs_paths) if a in response["results"]}
+        else:
+            cache = open_cache(cache_file, manifests, args.model)
+            results = count_files(args.files, args.model, cache, args.workers, stream_threshold)
+            if cache is not None:
+                cache.evict_missing()
+                cache.save()
         print(json.dumps(results))
     else:
         content = ""
         if args.file:
-            try:
-                with open(args.file, "r", encoding="utf-8") as f:
-                    content = f.read()
-            except Exception as e:
-                print(f"Error reading file: {e}", file=sys.stderr)
-                sys.exit(1)
+            response = None
+            if use_server:
+                response = query_server({"file": os.path.abspath(args.file), "model": args.model, "cache": not args.no_cache,
+                                         "exact": args.exact, "stream_threshold": args.stream_threshold, "manifests": manifests})
+            if response is not None and "tokens" in response:
+                tokens = response["tokens"]
+            else:
+                cache = open_cache(cache_file, manifests, args.model)
+                try:
+                    tokens = count_file(args.file, args.model, cache, stream_threshold)
+                except Exception as e:
+                    print(f"Error reading file: {e}", file=sys.stderr)
+                    sys.exit(1)
+                if cache is not None:
+                    cache.save()
+            print(tokens)
+            sys.exit(0)
         elif args.text is not None:
             content = args.text
         else:
@@ -47,8 +808,12 @@ if __name__ == "__main__":
             if not sys.stdin.isatty():
                 content = sys.stdin.read()
             else:
-                print("Error: No input provided. Use --file, --text, --files, or pipe to stdin.", file=sys.stderr)
+                print("Error: No input provided. Use --file, --text, --files, --dir, or pipe to stdin.", file=sys.stderr)
                 sys.exit(1)
 
-        tokens = count_tokens(content, args.model)
+        response = query_server({"text": content, "model": args.model}) if use_server else None
+        if response is not None and "tokens" in response:
+            tokens = response["tokens"]
+        else:
+            tokens = count_tokens(content, args.model)
         print(tokens)
@@ -5,6 +5,7 @@ $script:AsanaSyncState = @{
     Running    = $false
     LastSync   = $null
     SyncScript = ""
+    DaemonState = ""
     Window     = $null
     Restoring  = $false
 }
@@ -13,7 +14,11 @@ function Invoke-PythonScriptAsync {
     param(
         [string]$ScriptPath,
         [System.Windows.Controls.TextBox]$OutputBox,
-        [scriptblock]$OnComplete
+        [scriptblock]$OnComplete,
+        # Optional: send DaemonRequest (one JSON line) to the daemon in DaemonStatePath first;
+        # python is only started when no daemon answers
+        [string]$DaemonStatePath = "",
+        [string]$DaemonRequest = ""
     )
 
     if ($null -eq $OutputBox) { return }
@@ -38,8 +43,40 @@ function Invoke-PythonScriptAsync {
     $ps.Runspace = $rs
     $rs.SessionStateProxy.SetVariable('ScriptPath', $ScriptPath)
     $rs.SessionStateProxy.SetVariable('syncState', $syncState)
+    $rs.SessionStateProxy.SetVariable('DaemonStatePath', $DaemonStatePath)
+    $rs.SessionStateProxy.SetVariable('DaemonRequest', $DaemonRequest)
 
     $ps.AddScript({
+        if ($DaemonRequest -and $DaemonStatePath -and (Test-Path $DaemonStatePath)) {
+            $client = $null
+            try {
+                $port = [int]((Get-Content $DaemonStatePath -Raw -Encoding UTF8 | ConvertFrom-Json).port)
+                $client = New-Object System.Net.Sockets.TcpClient
+                if ($client.ConnectAsync("127.0.0.1", $port).Wait(200)) {
+                    $stream = $client.GetStream()
+                    $bytes = [System.Text.Encoding]::UTF8.GetBytes($DaemonRequest + "`n")
+                    $stream.Write($bytes, 0, $bytes.Length)
+                    $reader = New-Object System.IO.StreamReader($stream, [System.Text.Encoding]::UTF8)
+                    $line = $reader.ReadLine()
+                    if ($line) {
+                        $response = $line | ConvertFrom-Json
+                        $syncState.Stdout = "[sync daemon on port $port]`r`n" + [string]$response.log
+                        if (-not $response.ok) {
+                            $syncState.Stderr   = "ERROR: $($response.error)"
+                            $syncState.ExitCode = 1
+                        }
+                        $syncState.Completed = $true
+                        return
+                    }
+                }
+            }
+            catch {
+                # Stale state file or daemon gone: run python below
+            }
+            finally {
+                if ($null -ne $client) { $client.Close() }
+            }
+        }
         try {
             $psi = New-Object System.Diagnostics.ProcessStartInfo
             $psi.FileName = "python"
@@ -252,6 +289,11 @@ function Save-AsanaProjectConfig {
 # --- Shared sync logic ---
 
 function Invoke-AsanaSync {
+    param(
+        # Timer tick: the daemon (if running) skips its own interval while these keep arriving
+        [switch]$Scheduled
+    )
+
     $w = $script:AsanaSyncState.Window
     if ($null -eq $w) { return }
 
@@ -289,8 +331,13 @@ function Invoke-AsanaSync {
         )
     }
 
+    $request = @{ cmd = "sync" }
+    if ($Scheduled) { $request.schedule_minutes = $script:AsanaSyncState.Timer.Interval.TotalMinutes }
+
     Invoke-PythonScriptAsync -ScriptPath $script:AsanaSyncState.SyncScript `
         -OutputBox $txtOutput `
+        -DaemonStatePath $script:AsanaSyncState.DaemonState `
+        -DaemonRequest ($request | ConvertTo-Json -Compress) `
         -OnComplete {
             $w = $script:AsanaSyncState.Window
             $lblLastSync = $w.FindName("lblAsanaLastSync")
@@ -320,6 +367,8 @@ function Initialize-TabAsanaSync {
     $script:AsanaSyncState.Window = $Window
     $globalScriptsDir = Join-Path (Split-Path (Split-Path $ScriptDir)) "_globalScripts"
     $script:AsanaSyncState.SyncScript = Join-Path $globalScriptsDir "sync_from_asana.py"
+    # Written by "sync_from_asana.py --daemon"; present only while a daemon is running
+    $script:AsanaSyncState.DaemonState = Join-Path $globalScriptsDir ".sync_daemon.json"
 
     # Load saved config
     $savedConfig = Get-AsanaSyncConfig
@@ -339,7 +388,7 @@ function Initialize-TabAsanaSync {
                     $txtOutput.AppendText("`r`n=== Scheduled Sync ===`r`n")
                 }
             }
-            Invoke-AsanaSync
+            Invoke-AsanaSync -Scheduled
         })
     $script:AsanaSyncState.Timer = $timer
 